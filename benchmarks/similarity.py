@@ -0,0 +1,99 @@
+"""
+Line Similarity Benchmark
+
+Checks that the vectorized `count_ratios` and `LineIndex` lookups return the same results as
+the scalar `count_ratio` and `is_similar` on a generated file, then times one hunk line
+against every line of the file with each of them.
+
+Usage:
+    python -m benchmarks.similarity [--lines 10000] [--queries 50]
+"""
+
+import argparse
+import random
+import string
+import time
+
+from proto_builder.core.diff import (
+    CharCountMatrix,
+    LineIndex,
+    count_ratio,
+    count_ratios,
+    is_similar,
+    normalize_line,
+)
+
+
+def make_file(rng: random.Random, n_lines: int):
+    alphabet = string.ascii_letters + string.digits + "    _(){}[]=+-.,:#'\""
+    templates = [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 100)))
+        for _ in range(n_lines // 4)
+    ]
+    lines = []
+    for _ in range(n_lines):
+        line = rng.choice(templates)
+        if line and rng.random() < 0.5:
+            # near duplicates, as in real code
+            position = rng.randrange(len(line))
+            line = line[:position] + rng.choice(alphabet) + line[position + 1 :]
+        lines.append(line)
+    return lines
+
+
+def timed(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    lines = make_file(rng, args.lines)
+    lines_dict = {number: line for number, line in enumerate(lines, start=1)}
+    queries = [rng.choice(lines) for _ in range(args.queries // 2)] + make_file(
+        rng, args.queries - args.queries // 2
+    )
+
+    matrix = CharCountMatrix(lines)
+    index = LineIndex(lines_dict)
+    for query in queries:
+        assert list(matrix.ratios(query)) == [count_ratio(query, line) for line in lines]
+        assert index.similar_lines(query) == [
+            number for number, line in lines_dict.items() if is_similar(query, line)
+        ]
+        assert index.exact_lines(query) == [
+            number
+            for number, line in lines_dict.items()
+            if normalize_line(line) == normalize_line(query)
+        ]
+    print(f"{args.lines} lines, {len(queries)} queries, results identical")
+
+    query = queries[0]
+    # lookups are memoized, so every timed fuzzy lookup uses a different line
+    misses = iter(
+        "".join(rng.choice(string.ascii_letters) for _ in range(60)) for _ in range(20)
+    )
+    results = [
+        ("scalar count_ratio", timed(lambda: [count_ratio(query, l) for l in lines], 3)),
+        ("count_ratios (build + score)", timed(lambda: count_ratios(query, lines), 3)),
+        ("CharCountMatrix.ratios", timed(lambda: matrix.ratios(query), 20)),
+        ("LineIndex build", timed(lambda: LineIndex(lines_dict), 3)),
+        ("LineIndex.exact_lines", timed(lambda: index.exact_lines(query), 1000)),
+        (
+            "LineIndex.similar_lines (miss)",
+            timed(lambda: index.similar_lines(next(misses)), 20),
+        ),
+    ]
+    for name, milliseconds in results:
+        print(f"{name:32} {milliseconds:10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+FilesDict.to_chat Benchmark
+
+Checks that `FilesDict.to_chat` renders the same prompt as the original string-concatenation
+implementation on a generated selection of files, then times the first render, a render of the
+unchanged selection as in the next improve iteration, and a render after one file changed.
+
+Usage:
+    python -m benchmarks.to_chat [--megabytes 5] [--files 200]
+"""
+
+import argparse
+import random
+import string
+import time
+
+from proto_builder.core.files_dict import FilesDict, file_to_lines_dict
+
+
+def to_chat_concatenated(files: FilesDict) -> str:
+    """The original rendering, concatenating every line to one string."""
+    chat_str = ""
+    for file_name, file_content in files.items():
+        lines_dict = file_to_lines_dict(file_content)
+        chat_str += f"File: {file_name}\n"
+        for line_number, line_content in lines_dict.items():
+            chat_str += f"{line_number} {line_content}\n"
+        chat_str += "\n"
+    return f"```\n{chat_str}```"
+
+
+def make_files(rng: random.Random, total_chars: int, n_files: int) -> FilesDict:
+    alphabet = string.ascii_letters + string.digits + "    _(){}[]=+-.,:"
+    files = FilesDict()
+    for index in range(n_files):
+        lines = []
+        size = 0
+        while size < total_chars // n_files:
+            line = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+            lines.append(line)
+            size += len(line) + 1
+        files[f"src/module_{index}.py"] = "\n".join(lines)
+    return files
+
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--megabytes", type=float, default=5)
+    parser.add_argument("--files", type=int, default=200)
+    args = parser.parse_args()
+
+    files = make_files(random.Random(42), int(args.megabytes * 1024 * 1024), args.files)
+    assert files.to_chat() == to_chat_concatenated(files)
+    print(f"{len(files)} files, {sum(map(len, files.values()))} characters, output identical")
+
+    # fresh contents, so that neither the digests nor the fragments are cached
+    files = FilesDict({name: "".join(content) for name, content in files.items()})
+    results = [("concatenation", timed(lambda: to_chat_concatenated(files)))]
+    results.append(("to_chat, first render", timed(files.to_chat)))
+    results.append(("to_chat, unchanged", timed(files.to_chat)))
+    iteration = files.copy()
+    name = next(iter(iteration))
+    iteration[name] = iteration[name] + "\n# edited"
+    results.append(("to_chat, one file changed", timed(iteration.to_chat)))
+    for label, milliseconds in results:
+        print(f"{label:28} {milliseconds:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
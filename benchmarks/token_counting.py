@@ -0,0 +1,130 @@
+"""
+Token Counting Benchmark
+
+Checks that the memoized `Tokenizer.num_tokens_from_messages` returns the same counts as
+counting every message from scratch, for text, image and mixed-content messages, then times
+both while a conversation grows turn by turn, as `TokenUsageLog.update_log` counts it.
+
+Usage:
+    python -m benchmarks.token_counting [--turns 50] [--model gpt-4o]
+"""
+
+import argparse
+import base64
+import io
+import random
+import string
+import time
+
+from typing import List
+
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from PIL import Image
+
+from proto_builder.core.ai import Message
+from proto_builder.core.token_usage import Tokenizer
+
+
+def count_uncached(model_name: str, messages: List[Message]) -> int:
+    """
+    Count the tokens of the messages one by one, as before the memo, with a fresh tokenizer.
+    """
+    tokenizer = Tokenizer(model_name)
+    n_tokens = 0
+    for message in messages:
+        n_tokens += 4
+        if isinstance(message.content, str):
+            n_tokens += tokenizer.num_tokens(message.content)
+        else:
+            for item in message.content:
+                if item.get("type") == "text":
+                    n_tokens += tokenizer.num_tokens(item["text"])
+                elif item.get("type") == "image_url":
+                    n_tokens += tokenizer.num_tokens_for_base64_image(
+                        item["image_url"]["url"],
+                        detail=item["image_url"].get("detail", "high"),
+                    )
+        n_tokens += 2
+    return n_tokens
+
+
+def make_text(rng: random.Random, n_lines: int) -> str:
+    alphabet = string.ascii_letters + string.digits + " _(){}[]=+-.,:"
+    return "\n".join(
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+        for _ in range(n_lines)
+    )
+
+
+def make_image(size, image_format: str) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color=(120, 30, 200)).save(buffer, format=image_format)
+    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return f"data:image/{image_format.lower()};base64,{encoded}"
+
+
+def make_turn(rng: random.Random, turn: int, images: List[str]) -> List[Message]:
+    text = make_text(rng, rng.randint(5, 200))
+    if turn % 3 == 0:
+        # mixed content: text and an image, as sent for vision prompts
+        content = [
+            {"type": "text", "text": text},
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": images[turn % len(images)],
+                    "detail": "low" if turn % 2 else "high",
+                },
+            },
+        ]
+    elif turn % 3 == 1:
+        # the same file listing sent again, as in improve retries
+        content = make_text(random.Random(0), 300)
+    else:
+        content = text
+    return [HumanMessage(content=content), AIMessage(content=make_text(rng, 60))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--model", default="gpt-4o")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    images = [
+        make_image((1200, 900), "PNG"),
+        make_image((300, 4000), "JPEG"),
+        make_image((64, 64), "GIF"),
+    ]
+
+    tokenizer = Tokenizer(args.model)
+    for image in images:
+        expected = Image.open(
+            io.BytesIO(base64.b64decode(image.partition(",")[2]))
+        ).size
+        assert tokenizer.image_size_for_base64_image(image) == expected
+
+    messages: List[Message] = [SystemMessage(content=make_text(rng, 100))]
+    memoized_time = uncached_time = 0.0
+    for turn in range(args.turns):
+        messages.extend(make_turn(rng, turn, images))
+
+        start = time.perf_counter()
+        memoized = tokenizer.num_tokens_from_messages(messages)
+        memoized_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        uncached = count_uncached(args.model, messages)
+        uncached_time += time.perf_counter() - start
+
+        assert memoized == uncached, (turn, memoized, uncached)
+
+    print(f"{args.turns} turns, {len(messages)} messages, counts identical")
+    print(f"uncached: {uncached_time * 1000:9.1f} ms")
+    print(f"memoized: {memoized_time * 1000:9.1f} ms")
+    print(f"speedup:  {uncached_time / memoized_time:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,7 @@ from typing import Any, Dict, Generator, List, Union
 
 import toml
 
+from proto_builder.core.default.constants import IGNORE_FOLDERS
 from proto_builder.core.default.disk_memory import DiskMemory
 from proto_builder.core.default.paths import metadata_path
 from proto_builder.core.files_dict import FilesDict
@@ -42,7 +43,7 @@ class FileSelector:
 
     Attributes
     ----------
-    IGNORE_FOLDERS : set
+    IGNORE_FOLDERS : frozenset
         A set of directory names to ignore during file selection.
     FILE_LIST_NAME : str
         The name of the file that stores the selected files list.
@@ -50,7 +51,7 @@ class FileSelector:
         The comment string to be added to the top of the file selection list.
     """
 
-    IGNORE_FOLDERS = {"site-packages", "node_modules", "venv", "__pycache__"}
+    IGNORE_FOLDERS = IGNORE_FOLDERS
     FILE_LIST_NAME = "file_selection.toml"
     COMMENT = (
         "# Remove '#' to select a file or turn off linting.\n\n"
@@ -25,6 +25,8 @@ Constants
 ---------
 TERM_CHOICES : tuple
     Terminal color choices for user interactive prompts, formatted with termcolor for readability.
+MAX_LEARNING_LOG_BYTES : int
+    The default maximum size of the serialized logs attached to a learning.
 """
 
 import json
@@ -34,7 +36,7 @@ import tempfile
 from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 
 from dataclasses_json import dataclass_json
 from termcolor import colored
@@ -109,6 +111,9 @@ class Learning:
     version: str = "0.3"
 
 
+# Files that would grow the serialized logs of a learning beyond this size are left out
+MAX_LEARNING_LOG_BYTES = 16 * 1024 * 1024
+
 TERM_CHOICES = (
     colored("y", "green")
     + "/"
@@ -241,6 +246,8 @@ def extract_learning(
     config: Tuple[str, ...],
     memory: DiskMemory,
     review: Review,
+    max_log_bytes: Optional[int] = MAX_LEARNING_LOG_BYTES,
+    include: Optional[Callable[[str], bool]] = None,
 ) -> Learning:
     """
     Constructs a Learning object containing the session's metadata and user feedback.
@@ -259,6 +266,10 @@ def extract_learning(
         An object representing the disk memory used during the session.
     review : Review
         The user's review of the generated code.
+    max_log_bytes : int, optional
+        The approximate maximum size of the serialized logs, None for no limit.
+    include : Callable[[str], bool], optional
+        A filter on the memory keys to include in the logs.
 
     Returns
     -------
@@ -271,7 +282,7 @@ def extract_learning(
         temperature=temperature,
         config=json.dumps(config),
         session=get_session(),
-        logs=memory.to_json(),
+        logs=memory.to_json(max_bytes=max_log_bytes, include=include),
         review=review,
     )
 
@@ -9,8 +9,14 @@ from proto_builder.applications.cli.cli_agent import CliAgent
 from proto_builder.core.default.disk_memory import DiskMemory
 from proto_builder.core.default.disk_execution_env import DiskExecutionEnv
 from runtime.docker_execution_env import DockerExecutionEnv
-from proto_builder.core.default.paths import PREPROMPTS_PATH, memory_path
+from proto_builder.core.default.paths import (
+    PREPROMPTS_PATH,
+    memory_path,
+    response_cache_path,
+)
 from proto_builder.core.ai import AI
+from proto_builder.core.response_cache import ResponseCache
+from proto_builder.core.token_usage import ENCODING_REGISTRY
 from proto_builder.core.prompt import Prompt
 from proto_builder.core.default.steps import (
     gen_code,
@@ -135,7 +141,18 @@ def main():
     Main entry point for the CLI application.
     Demonstrates retrieving preprompts using PrepromptsHolder.
     """
+    parser = argparse.ArgumentParser(description="Generate a project with proto-builder.")
+    parser.add_argument(
+        "--cache-responses",
+        action="store_true",
+        help="Answer repeated model requests from the response cache in the user cache "
+        "directory instead of requesting a new completion.",
+    )
+    args = parser.parse_args()
     logging.info("Running proto builder...")
+    model_name = "o3-mini"
+    # load the tokenizer while the prompt and container are being set up
+    ENCODING_REGISTRY.warm([model_name])
     # TODO: hacky way to get the project path
     # project_path = Path(__file__).parent.parent.parent
     project_path = "/tmp/mar13-4pm" 
@@ -174,8 +191,9 @@ def main():
     )
 
     ai = AI(
-        model_name="o3-mini"
+        model_name=model_name,
         # temperature=0.1
+        cache=ResponseCache(response_cache_path()) if args.cache_responses else None,
     )
     agent = CliAgent(
         memory,
@@ -188,6 +206,7 @@ def main():
     )
     print("Generating files...")
     files_dict = agent.init(prompt)
+    logging.info(f"Tokenizer load times: {ENCODING_REGISTRY.load_times()}")
     print("DONE DONE")
 
 
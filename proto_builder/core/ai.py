@@ -20,7 +20,8 @@ import logging
 import os
 
 from pathlib import Path
-from typing import Any, List, Optional, Union
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 import backoff
 import openai
@@ -38,6 +39,7 @@ from langchain.schema import (
 from langchain_anthropic import ChatAnthropic
 from langchain_openai import AzureChatOpenAI, ChatOpenAI
 
+from proto_builder.core.response_cache import ResponseCache
 from proto_builder.core.token_usage import TokenUsageLog
 
 # Type hint for a chat message
@@ -47,6 +49,27 @@ Message = Union[AIMessage, HumanMessage, SystemMessage]
 logger = logging.getLogger(__name__)
 
 
+class TokenStreamHandler(StreamingStdOutCallbackHandler):
+    """
+    Streams tokens to stdout like `StreamingStdOutCallbackHandler` and forwards them to the
+    listeners currently attached, such as an incremental diff parser.
+
+    Attributes
+    ----------
+    listeners : List[Callable[[str], None]]
+        The callables receiving every new token.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.listeners: List[Callable[[str], None]] = []
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        super().on_llm_new_token(token, **kwargs)
+        for listener in self.listeners:
+            listener(token)
+
+
 class AI:
     """
     A class that interfaces with language models for conversation management and message serialization.
@@ -68,6 +91,12 @@ class AI:
         The language model instance for conversation management.
     token_usage_log : TokenUsageLog
         A log for tracking token usage during conversations.
+    stream_handler : TokenStreamHandler
+        The callback handler printing streamed tokens and forwarding them to listeners.
+    cache : ResponseCache, optional
+        An on-disk cache of model responses, consulted before every inference.
+    prompt_caching : bool
+        Whether the stable prefix of each request is marked as cacheable for the provider.
 
     Methods
     -------
@@ -75,8 +104,18 @@ class AI:
         Start the conversation with a system message and a user message.
     next(messages: List[Message], prompt: Optional[str], step_name: str) -> List[Message]
         Advances the conversation by sending message history to LLM and updating with the response.
+    astart(system: str, user: str, step_name: str) -> List[Message]
+        Coroutine version of `start`.
+    anext(messages: List[Message], prompt: Optional[str], step_name: str) -> List[Message]
+        Coroutine version of `next`.
+    cached_inference(messages: List[Message]) -> Tuple[Any, bool]
+        Answer from the response cache, falling back to `backoff_inference`.
     backoff_inference(messages: List[Message]) -> Any
         Perform inference using the language model with an exponential backoff strategy.
+    abackoff_inference(messages: List[Message]) -> Any
+        Coroutine version of `backoff_inference`, built on the model's `ainvoke`.
+    mark_cacheable_prefix(messages: List[Message]) -> List[Message]
+        Mark the system prompt and the initial context as a cacheable prompt prefix.
     serialize_messages(messages: List[Message]) -> str
         Serialize a list of messages to a JSON string.
     deserialize_messages(jsondictstr: str) -> List[Message]
@@ -92,6 +131,8 @@ class AI:
         azure_endpoint=None,
         streaming=True,
         vision=False,
+        cache: Optional[ResponseCache] = None,
+        prompt_caching: Optional[bool] = None,
     ):
         """
         Initialize the AI class.
@@ -102,6 +143,11 @@ class AI:
             The name of the model to use, by default "gpt-4".
         temperature : float, optional
             The temperature to use for the model, by default 0.1.
+        cache : ResponseCache, optional
+            A response cache to answer repeated requests from, by default None.
+        prompt_caching : bool, optional
+            Whether to mark stable prompt prefixes as cacheable, by default only for
+            providers supporting explicit cache markers (Anthropic models).
         """
         self.temperature = temperature
         self.azure_endpoint = azure_endpoint
@@ -112,7 +158,14 @@ class AI:
             or ("gpt-4-turbo" in model_name and "preview" not in model_name)
             or ("claude" in model_name)
         )
+        self.cache = cache
+        if prompt_caching is None:
+            prompt_caching = "claude" in model_name and not azure_endpoint
+        self.prompt_caching = prompt_caching
+        self.stream_handler = TokenStreamHandler()
         self.llm = self._create_chat_model()
+        # copy of `llm` used by the coroutines and the `llm` it was made from
+        self._allm: Optional[Tuple[BaseChatModel, BaseChatModel]] = None
         self.token_usage_log = TokenUsageLog(model_name)
 
         logger.debug(f"Using model {self.model_name}")
@@ -229,6 +282,89 @@ class AI:
             The updated list of messages in the conversation.
         """
 
+        messages = self._prepare_messages(messages, prompt)
+        response, cache_hit = self.cached_inference(messages)
+        return self._record_response(messages, response, step_name, cache_hit)
+
+    async def astart(
+        self, system: str, user: Any, *, step_name: str
+    ) -> List[Message]:
+        """
+        Coroutine counterpart of `start`, awaiting the model instead of blocking on it.
+
+        Parameters
+        ----------
+        system : str
+            The content of the system message.
+        user : str
+            The content of the user message.
+        step_name : str
+            The name of the step.
+
+        Returns
+        -------
+        List[Message]
+            The list of messages in the conversation.
+        """
+        messages: List[Message] = [
+            SystemMessage(content=system),
+            HumanMessage(content=user),
+        ]
+        return await self.anext(messages, step_name=step_name)
+
+    async def anext(
+        self,
+        messages: List[Message],
+        prompt: Optional[str] = None,
+        *,
+        step_name: str,
+    ) -> List[Message]:
+        """
+        Coroutine counterpart of `next`. The request is sent with the model's `ainvoke`,
+        so many conversations can wait on the network concurrently on one event loop.
+        Token usage is recorded in `token_usage_log` exactly as in `next`. The completion
+        is not streamed to stdout, where concurrent completions would interleave.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The list of messages in the conversation.
+        prompt : Optional[str], optional
+            The prompt to use, by default None.
+        step_name : str
+            The name of the step.
+
+        Returns
+        -------
+        List[Message]
+            The updated list of messages in the conversation.
+        """
+        messages = self._prepare_messages(messages, prompt)
+        response, cache_hit = await self.acached_inference(messages)
+        return self._record_response(messages, response, step_name, cache_hit)
+
+    @contextmanager
+    def stream_to(self, listener: Callable[[str], None]) -> Iterator[None]:
+        """
+        Forward every token streamed by the model to `listener` while the context is active.
+
+        Parameters
+        ----------
+        listener : Callable[[str], None]
+            The callable receiving each new token.
+        """
+        self.stream_handler.listeners.append(listener)
+        try:
+            yield
+        finally:
+            self.stream_handler.listeners.remove(listener)
+
+    def _prepare_messages(
+        self, messages: List[Message], prompt: Optional[str]
+    ) -> List[Message]:
+        """
+        Append the optional prompt and collapse text messages for non-vision models.
+        """
         if prompt:
             messages.append(HumanMessage(content=prompt))
 
@@ -239,17 +375,81 @@ class AI:
 
         if not self.vision:
             messages = self._collapse_text_messages(messages)
+        return messages
 
-        response = self.backoff_inference(messages)
-
+    def _record_response(
+        self,
+        messages: List[Message],
+        response: Any,
+        step_name: str,
+        cache_hit: bool = False,
+    ) -> List[Message]:
+        """
+        Update the token usage log with the completion and append it to the conversation.
+        """
         self.token_usage_log.update_log(
-            messages=messages, answer=response.content, step_name=step_name
+            messages=messages,
+            answer=response.content,
+            step_name=step_name,
+            cache_hit=cache_hit,
+            cached_prompt_tokens=cached_prompt_tokens(response),
         )
         messages.append(response)
         logger.debug(f"Chat completion finished: {messages}")
 
         return messages
 
+    def _cache_key(self, messages: List[Message]) -> str:
+        return ResponseCache.make_key(
+            self.model_name, self.temperature, self.serialize_messages(messages)
+        )
+
+    def _cache_lookup(self, key: str) -> Optional[Message]:
+        cached = self.cache.get(key)
+        if cached is None:
+            return None
+        logger.debug(f"Response cache hit for {key}")
+        return self.deserialize_messages(cached)[0]
+
+    def cached_inference(self, messages: List[Message]) -> Tuple[Any, bool]:
+        """
+        Answer the request from the response cache if possible, otherwise run `backoff_inference`
+        and store its response.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            A list of chat messages which will be passed to the language model for processing.
+
+        Returns
+        -------
+        Tuple[Any, bool]
+            The response of the language model and whether it was served from the cache.
+        """
+        if self.cache is None:
+            return self.backoff_inference(messages), False
+        key = self._cache_key(messages)
+        response = self._cache_lookup(key)
+        if response is not None:
+            return response, True
+        response = self.backoff_inference(messages)
+        self.cache.put(key, self.serialize_messages([response]))
+        return response, False
+
+    async def acached_inference(self, messages: List[Message]) -> Tuple[Any, bool]:
+        """
+        Coroutine counterpart of `cached_inference`, using `abackoff_inference` on a miss.
+        """
+        if self.cache is None:
+            return await self.abackoff_inference(messages), False
+        key = self._cache_key(messages)
+        response = self._cache_lookup(key)
+        if response is not None:
+            return response, True
+        response = await self.abackoff_inference(messages)
+        self.cache.put(key, self.serialize_messages([response]))
+        return response, False
+
     @backoff.on_exception(backoff.expo, openai.RateLimitError, max_tries=7, max_time=45)
     def backoff_inference(self, messages):
         """
@@ -284,7 +484,78 @@ class AI:
         >>> messages = [SystemMessage(content="Hello"), HumanMessage(content="How's the weather?")]
         >>> response = backoff_inference(messages)
         """
-        return self.llm.invoke(messages)  # type: ignore
+        return self.llm.invoke(self.mark_cacheable_prefix(messages))  # type: ignore
+
+    @backoff.on_exception(backoff.expo, openai.RateLimitError, max_tries=7, max_time=45)
+    async def abackoff_inference(self, messages):
+        """
+        Coroutine counterpart of `backoff_inference`, using the model's `ainvoke`.
+
+        The same exponential backoff on `openai.RateLimitError` applies; while waiting
+        between retries the event loop is free to serve other conversations.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            A list of chat messages which will be passed to the language model for processing.
+
+        Returns
+        -------
+        Any
+            The output from the language model after processing the provided messages.
+        """
+        model = self._async_model()
+        return await model.ainvoke(self.mark_cacheable_prefix(messages))  # type: ignore
+
+    def _async_model(self) -> BaseChatModel:
+        """
+        Get a copy of `llm` without the stdout streaming callbacks, for concurrent requests.
+        The copy is remade when `llm` is replaced, e.g. by a fake chat model.
+        """
+        if self._allm is None or self._allm[0] is not self.llm:
+            update: Dict[str, Any] = {"callbacks": None}
+            if "streaming" in type(self.llm).model_fields:
+                update["streaming"] = False
+            self._allm = (self.llm, self.llm.model_copy(update=update))
+        return self._allm[1]
+
+    def mark_cacheable_prefix(self, messages: List[Message]) -> List[Message]:
+        """
+        Mark the stable prefix of a request as cacheable by the provider.
+
+        The system prompt and, when the conversation continues after it, the first user
+        message (the file listing in `improve_fn`) do not change between the retries of a
+        step, so they are given an ephemeral `cache_control` marker. Providers supporting
+        prompt caching then skip re-processing that prefix. The markers are only added to
+        the copies sent to the model: the conversation, the logs and the response cache
+        key are unaffected. A fake chat model recording its input can be used to inspect
+        the markers.
+
+        Parameters
+        ----------
+        messages : List[Message]
+            The messages of the request.
+
+        Returns
+        -------
+        List[Message]
+            The messages with cache markers, or the messages unchanged if prompt caching
+            is disabled.
+        """
+        if not self.prompt_caching:
+            return messages
+        prefix = []
+        for index, message in enumerate(messages):
+            if isinstance(message, SystemMessage):
+                prefix.append(index)
+            elif isinstance(message, HumanMessage):
+                if any(isinstance(m, HumanMessage) for m in messages[index + 1 :]):
+                    prefix.append(index)
+                break
+        marked = list(messages)
+        for index in prefix:
+            marked[index] = _with_cache_control(messages[index])
+        return marked
 
     @staticmethod
     def serialize_messages(messages: List[Message]) -> str:
@@ -352,13 +623,13 @@ class AI:
                 deployment_name=self.model_name,
                 openai_api_type="azure",
                 streaming=self.streaming,
-                callbacks=[StreamingStdOutCallbackHandler()],
+                callbacks=[self.stream_handler],
             )
         elif "claude" in self.model_name:
             return ChatAnthropic(
                 model=self.model_name,
                 temperature=self.temperature,
-                callbacks=[StreamingStdOutCallbackHandler()],
+                callbacks=[self.stream_handler],
                 streaming=self.streaming,
                 max_tokens_to_sample=4096,
             )
@@ -366,14 +637,14 @@ class AI:
             return ChatOpenAI(
                 model=self.model_name,
                 streaming=self.streaming,
-                callbacks=[StreamingStdOutCallbackHandler()],
+                callbacks=[self.stream_handler],
             )
         elif self.vision:
             return ChatOpenAI(
                 model=self.model_name,
                 temperature=self.temperature,
                 streaming=self.streaming,
-                callbacks=[StreamingStdOutCallbackHandler()],
+                callbacks=[self.stream_handler],
                 max_tokens=4096,  # vision models default to low max token limits
             )
         else:
@@ -381,7 +652,7 @@ class AI:
                 model=self.model_name,
                 temperature=self.temperature,
                 streaming=self.streaming,
-                callbacks=[StreamingStdOutCallbackHandler()],
+                callbacks=[self.stream_handler],
             )
 
 
@@ -389,10 +660,51 @@ def serialize_messages(messages: List[Message]) -> str:
     return AI.serialize_messages(messages)
 
 
+def _with_cache_control(message: Message) -> Message:
+    """Copy a message with an ephemeral cache marker on its last content block."""
+    if isinstance(message.content, str):
+        blocks = [{"type": "text", "text": message.content}]
+    else:
+        blocks = [
+            dict(block) if isinstance(block, dict) else {"type": "text", "text": block}
+            for block in message.content
+        ]
+    if not blocks:
+        return message
+    blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    return message.__class__(
+        content=blocks, additional_kwargs=message.additional_kwargs
+    )
+
+
+def cached_prompt_tokens(response: Any) -> int:
+    """
+    Get the number of prompt tokens the provider read from its prompt cache.
+
+    Parameters
+    ----------
+    response : Any
+        The response message of the language model.
+
+    Returns
+    -------
+    int
+        The number of cached prompt tokens, or 0 if the provider did not report any.
+    """
+    usage_metadata = getattr(response, "usage_metadata", None) or {}
+    details = usage_metadata.get("input_token_details") or {}
+    if details.get("cache_read"):
+        return details["cache_read"]
+    # Anthropic usage as reported before langchain exposed input token details
+    usage = (getattr(response, "response_metadata", None) or {}).get("usage") or {}
+    return usage.get("cache_read_input_tokens") or 0
+
+
 class ClipboardAI(AI):
     # Ignore not init superclass
     def __init__(self, **_):  # type: ignore
         self.vision = False
+        self.stream_handler = TokenStreamHandler()
         self.token_usage_log = TokenUsageLog("clipboard_llm")
 
     @staticmethod
@@ -441,3 +753,15 @@ class ClipboardAI(AI):
         logger.debug(f"Chat completion finished: {messages}")
 
         return messages
+
+    async def anext(
+        self,
+        messages: List[Message],
+        prompt: Optional[str] = None,
+        *,
+        step_name: str,
+    ) -> List[Message]:
+        """
+        Answers are pasted by the user one at a time, so this simply runs `next`.
+        """
+        return self.next(messages, prompt, step_name=step_name)
@@ -11,12 +11,23 @@ Key Components:
   object containing the current state of files. It applies the changes described by the Diff objects to the
   corresponding files in the FilesDict, updating the file contents as specified by the diffs.
 
+- apply_hunks: Applies the hunks of a single diff to a file's content by splicing slices of the original lines
+  with the added lines, in time linear in the size of the file and the diff.
+
+- hunk_edits: Reduces the hunks of a diff to the removed line numbers and the lines inserted after each line.
+
 - parse_diffs: Parses a string containing diffs in the unified git diff format, extracting the changes described
   in the diffs and organizing them into a dictionary of Diff objects, keyed by the filename to which each diff applies.
 
 - parse_diff_block: Parses a single block of text from a diff string, translating it into a Diff object that
   represents the changes described in that block of text.
 
+- StreamingDiffParser: Parses diffs incrementally from a completion while it is still streaming, emitting each
+  Diff as soon as its fenced block closes.
+
+- StreamingDiffValidator: Validates the diffs emitted by a StreamingDiffParser against the current files in a
+  background thread, so that validation overlaps with generation.
+
 This script is intended for use in environments where code collaboration or review is conducted through chat interfaces,
 allowing for the dynamic application of changes to code bases and the efficient handling of file and diff information in chat transcripts.
 """
@@ -24,16 +35,24 @@ allowing for the dynamic application of changes to code bases and the efficient
 import logging
 import re
 
-from typing import Dict, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from regex import regex
 
-from proto_builder.core.diff import ADD, REMOVE, RETAIN, Diff, Hunk
-from proto_builder.core.files_dict import FilesDict, file_to_lines_dict
+from proto_builder.core.diff import ADD, REMOVE, RETAIN, Diff, Hunk, LinesView
+from proto_builder.core.files_dict import FilesDict, PieceTableFilesDict
+from proto_builder.core.piece_table import splice_lines
 
 # Initialize a logger for this module
 logger = logging.getLogger(__name__)
 
+# Regex to match individual diff blocks
+DIFF_BLOCK_PATTERN = regex.compile(
+    r"```.*?\n\s*?--- .*?\n\s*?\+\+\+ .*?\n(?:@@ .*? @@\n(?:[-+ ].*?\n)*?)*?```",
+    re.DOTALL,
+)
+
 
 def chat_to_files_dict(chat: str) -> FilesDict:
     """
@@ -70,6 +89,9 @@ def apply_diffs(diffs: Dict[str, Diff], files: FilesDict) -> FilesDict:
     """
     Applies diffs to the provided files.
 
+    A PieceTableFilesDict is updated version by version, sharing all unedited parts of the files
+    with the original; any other mapping is copied into a FilesDict of whole-file strings.
+
     Args:
     - diffs (Dict[str, Diff]): A dictionary of diffs to apply, keyed by filename.
     - files (FilesDict): The original files to which diffs will be applied.
@@ -77,68 +99,86 @@ def apply_diffs(diffs: Dict[str, Diff], files: FilesDict) -> FilesDict:
     Returns:
     - FilesDict: The updated files after applying diffs.
     """
-    files = FilesDict(files.copy())
-    REMOVE_FLAG = "<REMOVE_LINE>"  # Placeholder to mark lines for removal
+    if isinstance(files, (FilesDict, PieceTableFilesDict)):
+        files = files.copy()
+    else:
+        files = FilesDict(files.copy())
     for diff in diffs.values():
         if diff.is_new_file():
             # If it's a new file, create it with the content from the diff
             files[diff.filename_post] = "\n".join(
                 line[1] for hunk in diff.hunks for line in hunk.lines
             )
+        elif isinstance(files, PieceTableFilesDict):
+            files[diff.filename_post] = files.table(diff.filename_pre).apply_edits(
+                *hunk_edits(diff.hunks)
+            )
         else:
-            # Convert the file content to a dictionary of lines
-            line_dict = file_to_lines_dict(files[diff.filename_pre])
-            for hunk in diff.hunks:
-                current_line = hunk.start_line_pre_edit
-                for line in hunk.lines:
-                    if line[0] == RETAIN:
-                        current_line += 1
-                    elif line[0] == ADD:
-                        # Handle added lines
-                        current_line -= 1
-                        if (
-                            current_line in line_dict.keys()
-                            and line_dict[current_line] != REMOVE_FLAG
-                        ):
-                            line_dict[current_line] += "\n" + line[1]
-                        else:
-                            line_dict[current_line] = line[1]
-                        current_line += 1
-                    elif line[0] == REMOVE:
-                        # Mark removed lines with REMOVE_FLAG
-                        line_dict[current_line] = REMOVE_FLAG
-                        current_line += 1
-
-            # Remove lines marked for removal
-            line_dict = {
-                key: line_content
-                for key, line_content in line_dict.items()
-                if REMOVE_FLAG not in line_content
-            }
-            # Reassemble the file content
-            files[diff.filename_post] = "\n".join(line_dict.values())
+            files[diff.filename_post] = apply_hunks(
+                files[diff.filename_pre], diff.hunks
+            )
     return files
 
 
-def parse_diffs(diff_string: str) -> dict:
+def apply_hunks(content: str, hunks: List[Hunk]) -> str:
+    """
+    Applies the hunks of a diff to the content of a file.
+
+    The hunks are reduced to line edits by `hunk_edits`, and the new content is spliced together
+    from slices of the original lines and the inserted lines, so the work is linear in the size
+    of the file and the diff.
+
+    Args:
+    - content (str): The original content of the file.
+    - hunks (List[Hunk]): The hunks to apply.
+
+    Returns:
+    - str: The content of the file after applying the hunks.
+    """
+    return "\n".join(splice_lines(content.split("\n"), *hunk_edits(hunks)))
+
+
+def hunk_edits(hunks: List[Hunk]) -> Tuple[Set[int], Dict[int, List[str]]]:
+    """
+    Reduces hunks, in one pass in order of their start line, to line edits.
+
+    Args:
+    - hunks (List[Hunk]): The hunks to reduce.
+
+    Returns:
+    - tuple: The set of removed line numbers, and the lines to insert after each line number,
+      0 meaning the start of the file.
+    """
+    removed = set()
+    inserted: Dict[int, List[str]] = {}
+    for hunk in sorted(hunks, key=lambda hunk: hunk.start_line_pre_edit):
+        current_line = hunk.start_line_pre_edit
+        for line_type, line_content in hunk.lines:
+            if line_type == RETAIN:
+                current_line += 1
+            elif line_type == ADD:
+                # Added lines go after the previous line
+                inserted.setdefault(current_line - 1, []).append(line_content)
+            elif line_type == REMOVE:
+                removed.add(current_line)
+                current_line += 1
+    return removed, inserted
+
+
+def parse_diffs(diff_string: str, diff_timeout: float = 1) -> dict:
     """
     Parses a diff string in the unified git diff format.
 
     Args:
     - diff_string (str): The diff string to parse.
+    - diff_timeout (float): The maximum time in seconds spent matching diff blocks.
 
     Returns:
     - dict: A dictionary of Diff objects keyed by filename.
     """
-    # Regex to match individual diff blocks
-    diff_block_pattern = regex.compile(
-        r"```.*?\n\s*?--- .*?\n\s*?\+\+\+ .*?\n(?:@@ .*? @@\n(?:[-+ ].*?\n)*?)*?```",
-        re.DOTALL,
-    )
-
     diffs = {}
     try:
-        for block in diff_block_pattern.finditer(diff_string, timeout=1):
+        for block in DIFF_BLOCK_PATTERN.finditer(diff_string, timeout=diff_timeout):
             diff_block = block.group()
 
             # Parse individual diff blocks and update the diffs dictionary
@@ -236,3 +276,133 @@ def parse_hunk_header(header_line) -> Tuple[int, int, int, int]:
         start_line_post_edit,
         hunk_len_post_edit,
     )
+
+
+class StreamingDiffParser:
+    """
+    Incrementally parses diffs out of a completion while it is still being generated.
+
+    Tokens are fed as they arrive and split into lines. Lines between an opening and a
+    closing ``` fence are collected, and when the fence closes the block is matched and
+    parsed exactly like `parse_diffs` does, emitting every complete Diff immediately.
+
+    Attributes:
+        diffs (dict): The Diff objects emitted so far, keyed by post-edit filename.
+    """
+
+    def __init__(
+        self, on_diff: Optional[Callable[[Diff], None]] = None, diff_timeout=1
+    ) -> None:
+        self.on_diff = on_diff
+        self.diff_timeout = diff_timeout
+        self.diffs = {}
+        self._partial_line = ""
+        self._block_lines: Optional[List[str]] = None
+
+    def feed(self, token: str) -> List[Diff]:
+        """
+        Feeds a streamed token to the parser.
+
+        Args:
+        - token (str): The next piece of the completion.
+
+        Returns:
+        - list: The Diff objects completed by this token.
+        """
+        completed = []
+        lines = (self._partial_line + token).split("\n")
+        self._partial_line = lines.pop()
+        for line in lines:
+            completed.extend(self._process_line(line))
+        return completed
+
+    def close(self) -> List[Diff]:
+        """
+        Flushes the last, unterminated line once the completion has finished.
+
+        Returns:
+        - list: The Diff objects completed by the last line.
+        """
+        line, self._partial_line = self._partial_line, ""
+        return self._process_line(line) if line else []
+
+    def _process_line(self, line: str) -> List[Diff]:
+        if self._block_lines is None:
+            if line.lstrip().startswith("```"):
+                self._block_lines = [line]
+            return []
+
+        self._block_lines.append(line)
+        if not line.startswith("```"):
+            return []
+
+        block_text = "\n".join(self._block_lines)
+        self._block_lines = None
+        completed = []
+        try:
+            for block in DIFF_BLOCK_PATTERN.finditer(
+                block_text, timeout=self.diff_timeout
+            ):
+                completed.extend(parse_diff_block(block.group()).values())
+        except TimeoutError:
+            logger.warning("Timed out while parsing a streamed diff block")
+        for diff in completed:
+            self.diffs[diff.filename_post] = diff
+            if self.on_diff is not None:
+                self.on_diff(diff)
+        return completed
+
+
+class StreamingDiffValidator:
+    """
+    Validates streamed diffs against the current files as soon as each diff is complete.
+
+    Feed it the tokens of a completion (e.g. through `AI.stream_to`). Every Diff emitted by
+    the underlying StreamingDiffParser is validated and corrected in a background thread
+    while the rest of the completion is still arriving. Afterwards, `take` hands out the
+    validated diff only if it is identical to the one the batch `parse_diffs` produced for
+    the final response, so the end result never differs from batch parsing.
+    """
+
+    def __init__(self, files: FilesDict, diff_timeout=1) -> None:
+        self.files = files
+        self.parser = StreamingDiffParser(on_diff=self._submit, diff_timeout=diff_timeout)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._validated: Dict[str, Tuple[str, Diff, Future]] = {}
+
+    def feed(self, token: str) -> None:
+        """Feeds a streamed token to the parser."""
+        self.parser.feed(token)
+
+    def close(self) -> None:
+        """Flushes the parser and waits for the pending validations."""
+        self.parser.close()
+        self._executor.shutdown(wait=True)
+
+    def _submit(self, diff: Diff) -> None:
+        if diff.is_new_file() or diff.filename_pre not in self.files:
+            return
+        source = diff.diff_to_string()
+        future = self._executor.submit(
+            diff.validate_and_correct,
+            LinesView(self.files[diff.filename_pre].split("\n")),
+        )
+        self._validated[diff.filename_post] = (source, diff, future)
+
+    def take(self, diff: Diff) -> Optional[Tuple[Diff, List[str]]]:
+        """
+        Returns the streamed, already validated counterpart of a batch-parsed diff.
+
+        Args:
+        - diff (Diff): A diff parsed from the final response by `parse_diffs`, not yet validated.
+
+        Returns:
+        - tuple or None: The validated Diff and its problems, or None if no identical diff was streamed.
+        """
+        entry = self._validated.pop(diff.filename_post, None)
+        if entry is None:
+            return None
+        source, validated_diff, future = entry
+        if source != diff.diff_to_string():
+            return None
+        return validated_diff, future.result()
@@ -8,5 +8,9 @@ Constants
 ---------
 MAX_EDIT_REFINEMENT_STEPS : int
     The maximum number of refinement steps allowed when generating edit blocks.
+
+IGNORE_FOLDERS : frozenset
+    The names of dependency and cache directories never read as project files.
 """
 MAX_EDIT_REFINEMENT_STEPS = 2
+IGNORE_FOLDERS = frozenset({"site-packages", "node_modules", "venv", "__pycache__"})
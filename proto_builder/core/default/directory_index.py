@@ -0,0 +1,196 @@
+"""
+Directory Index Module
+
+This module provides an in-memory index of the files below a directory, so that repeated listings
+do not walk and stat the whole tree. The index is built with `os.scandir` and invalidated when files
+are created, deleted or moved:
+
+- on Linux, through inotify watches on every indexed directory, added on the first listing and
+  read without blocking when the index is queried;
+- elsewhere, or when no watch can be added, by comparing the modification times of the indexed
+  directories, at most once every `POLL_INTERVAL` seconds.
+
+Classes:
+    DirectoryIndex: A cached, sorted listing of the files below a directory.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Minimum number of seconds between two checks of the directory modification times when polling
+POLL_INTERVAL = 1.0
+
+# inotify constants, from <sys/inotify.h>
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+_WATCH_MASK = (
+    _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_ONLYDIR
+)
+
+
+class _Inotify:
+    """A non-blocking inotify file descriptor, accessed through libc."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+    def add_watch(self, path: str) -> None:
+        if self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+
+    def has_events(self) -> bool:
+        """Drain the pending events, returning whether there were any."""
+        had_events = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return had_events
+            if not data:
+                return had_events
+            had_events = True
+
+
+def _close_fd(fd: int) -> None:
+    try:
+        os.close(fd)
+    except OSError:
+        pass
+
+
+class DirectoryIndex:
+    """
+    A cached, sorted listing of the files below a directory.
+
+    Attributes
+    ----------
+    path : Path
+        The indexed directory.
+    generation : int
+        Incremented every time the listing is rebuilt, so that callers can cache values
+        derived from it.
+    """
+
+    def __init__(self, path: Union[str, Path], use_inotify: bool = True):
+        self.path = Path(path)
+        self.generation = 0
+        self._files: Optional[List[str]] = None
+        self._dir_mtimes: Dict[str, int] = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._inotify: Optional[_Inotify] = None
+        # the inotify instance is created on the first scan, as instances are limited per
+        # user (fs.inotify.max_user_instances) and most indexes are never listed
+        self._use_inotify = use_inotify and sys.platform.startswith("linux")
+
+    def _start_inotify(self) -> None:
+        self._use_inotify = False
+        try:
+            self._inotify = _Inotify()
+        except (OSError, AttributeError) as error:
+            logger.debug(f"inotify unavailable, polling {self.path}: {error}")
+        else:
+            self._close_inotify = weakref.finalize(self, _close_fd, self._inotify.fd)
+
+    def files(self) -> List[str]:
+        """
+        Get the paths of the files below the directory, relative to it and sorted.
+
+        Returns
+        -------
+        List[str]
+            The relative paths of the files. The list is shared, callers must not modify it.
+        """
+        with self._lock:
+            if self._files is not None and self._changed():
+                self._files = None
+            if self._files is None:
+                if self._use_inotify:
+                    self._start_inotify()
+                self._files, self._dir_mtimes = self._scan()
+                self._checked_at = time.monotonic()
+                self.generation += 1
+            return self._files
+
+    def invalidate(self) -> None:
+        """Force the next listing to rescan the directory."""
+        with self._lock:
+            self._files = None
+
+    def _changed(self) -> bool:
+        if self._inotify is not None:
+            return self._inotify.has_events()
+        now = time.monotonic()
+        if now - self._checked_at < POLL_INTERVAL:
+            return False
+        self._checked_at = now
+        for directory, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def _watch(self, directory: str) -> None:
+        # re-adding the watch of an already watched directory is a no-op
+        try:
+            self._inotify.add_watch(directory)
+        except OSError as error:
+            # typically fs.inotify.max_user_watches is exhausted
+            logger.warning(f"Could not watch {self.path}, polling instead: {error}")
+            self._close_inotify()
+            self._inotify = None
+
+    def _scan(self) -> Tuple[List[str], Dict[str, int]]:
+        files = []
+        dir_mtimes = {}
+        pending = [str(self.path)]
+        root_length = len(str(self.path)) + 1
+        while pending:
+            directory = pending.pop()
+            try:
+                dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+                if self._inotify is not None:
+                    # watched before listing, so that no change is missed
+                    self._watch(directory)
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif entry.is_file():
+                            files.append(entry.path[root_length:])
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+        files.sort()
+        return files, dir_mtimes
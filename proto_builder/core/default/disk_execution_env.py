@@ -14,6 +14,7 @@ DiskExecutionEnv
 Imports
 -------
 - subprocess: For running shell commands.
+- selectors: For capturing the output of commands without blocking.
 - time: For timing the execution of commands.
 - Path: For handling file system paths.
 - Optional, Tuple, Union: For type annotations.
@@ -22,15 +23,26 @@ Imports
 - FilesDict: For handling collections of files.
 """
 
+import codecs
+import os
+import selectors
+import signal
 import subprocess
 import time
 
 from pathlib import Path
-from typing import Optional, Tuple, Union
+from typing import List, Optional, Tuple, Union
 
 from proto_builder.core.base_execution_env import BaseExecutionEnv
 from proto_builder.core.default.file_store import FileStore
-from proto_builder.core.files_dict import FilesDict
+from proto_builder.core.files_dict import FilesDict, LazyFilesDict
+
+# Maximum number of bytes read from an output pipe at once
+READ_CHUNK_SIZE = 64 * 1024
+# Maximum number of seconds waited for output before checking whether the command exited.
+# Background processes started by the command may keep the pipes open after it exited, the
+# output is then collected until the pipes stay idle for that long.
+SELECT_INTERVAL = 0.1
 
 
 class DiskExecutionEnv(BaseExecutionEnv):
@@ -56,7 +68,7 @@ class DiskExecutionEnv(BaseExecutionEnv):
         self.files.push(files)
         return self
 
-    def download(self) -> FilesDict:
+    def download(self) -> LazyFilesDict:
         return self.files.pull()
 
     def popen(self, command: str) -> subprocess.Popen:
@@ -70,6 +82,25 @@ class DiskExecutionEnv(BaseExecutionEnv):
         return p
 
     def run(self, command: str, timeout: Optional[int] = None) -> Tuple[str, str, int]:
+        """
+        Run a shell command in the working directory, echoing and capturing its output.
+
+        Both output pipes are read as soon as data is available, so that neither can stall
+        the other. When `timeout` seconds have passed, the whole process group of the
+        command is killed and `TimeoutError` is raised.
+
+        Parameters
+        ----------
+        command : str
+            The shell command to run.
+        timeout : Optional[int], optional
+            The maximum number of seconds the command may run, unlimited by default.
+
+        Returns
+        -------
+        Tuple[str, str, int]
+            The full stdout and stderr of the command, and its return code.
+        """
         start = time.time()
         print("\n--- Start of run ---")
         print("[Working directory:", self.files.working_dir, "]")
@@ -79,34 +110,94 @@ class DiskExecutionEnv(BaseExecutionEnv):
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             cwd=self.files.working_dir,
-            text=True,
             shell=True,
+            # a process group of its own, so that the children of the shell are killed too
+            start_new_session=os.name == "posix",
         )
         print("$", command)
-        stdout_full, stderr_full = "", ""
+        stdout_chunks: List[str] = []
+        stderr_chunks: List[str] = []
 
         try:
-            while p.poll() is None:
-                assert p.stdout is not None
-                assert p.stderr is not None
-                stdout = p.stdout.readline()
-                stderr = p.stderr.readline()
-                if stdout:
-                    print(stdout, end="")
-                    stdout_full += stdout
-                if stderr:
-                    print(stderr, end="")
-                    stderr_full += stderr
-                if timeout and time.time() - start > timeout:
+            if os.name == "posix":
+                self._capture(p, start, timeout, stdout_chunks, stderr_chunks)
+            else:
+                # selectors do not support pipes on Windows
+                try:
+                    stdout, stderr = p.communicate(timeout=timeout)
+                except subprocess.TimeoutExpired:
                     print("Timeout!")
                     p.kill()
                     raise TimeoutError()
+                for data, chunks in ((stdout, stdout_chunks), (stderr, stderr_chunks)):
+                    text = data.decode("utf-8", errors="replace")
+                    print(text, end="")
+                    chunks.append(text)
         except KeyboardInterrupt:
             print()
             print("Stopping execution.")
+            self._kill(p)
             print("Execution stopped.")
-            p.kill()
             print()
             print("--- Finished run ---\n")
 
-        return stdout_full, stderr_full, p.returncode
+        return "".join(stdout_chunks), "".join(stderr_chunks), p.returncode
+
+    def _capture(
+        self,
+        p: subprocess.Popen,
+        start: float,
+        timeout: Optional[int],
+        stdout_chunks: List[str],
+        stderr_chunks: List[str],
+    ) -> None:
+        deadline = start + timeout if timeout else None
+        with selectors.DefaultSelector() as selector:
+            for pipe, chunks in ((p.stdout, stdout_chunks), (p.stderr, stderr_chunks)):
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                selector.register(pipe, selectors.EVENT_READ, (chunks, decoder))
+
+            while selector.get_map():
+                exited = p.poll() is not None
+                wait = SELECT_INTERVAL
+                if deadline is not None:
+                    wait = min(deadline - time.time(), wait)
+                    if wait <= 0:
+                        print("Timeout!")
+                        self._kill(p)
+                        raise TimeoutError()
+                events = selector.select(wait)
+                if not events and exited:
+                    # the pipes are held open by processes left in the background
+                    break
+                for key, _ in events:
+                    chunks, decoder = key.data
+                    data = os.read(key.fd, READ_CHUNK_SIZE)
+                    final = not data
+                    if final:
+                        selector.unregister(key.fileobj)
+                    text = decoder.decode(data, final=final)
+                    if text:
+                        print(text, end="", flush=True)
+                        chunks.append(text)
+        p.stdout.close()
+        p.stderr.close()
+
+        wait = None if deadline is None else max(deadline - time.time(), 0)
+        try:
+            p.wait(timeout=wait)
+        except subprocess.TimeoutExpired:
+            print("Timeout!")
+            self._kill(p)
+            raise TimeoutError()
+
+    @staticmethod
+    def _kill(p: subprocess.Popen) -> None:
+        if os.name == "posix":
+            try:
+                os.killpg(p.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass  # the whole group already exited
+        else:
+            p.kill()
+        p.wait()
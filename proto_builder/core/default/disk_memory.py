@@ -18,19 +18,227 @@ Classes
 -------
 DiskMemory
     A file-based key-value store where keys correspond to filenames and values to file contents.
+LogWriter
+    A background thread appending log entries to files in batches.
+
+Archived logs are stored as compressed tar files, "logs_<timestamp>.tar.zst" when the optional
+`zstandard` package is installed and "logs_<timestamp>.tar.gz" otherwise, and are read back
+transparently under the keys "logs_<timestamp>/<name>".
 """
 
+import atexit
 import base64
+import codecs
+import io
 import json
+import logging
+import queue
+import os
 import shutil
+import tarfile
+import threading
+import time
 
+from collections import OrderedDict, defaultdict
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Iterator, Optional, Union
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 from proto_builder.core.base_memory import BaseMemory
+from proto_builder.core.default.directory_index import DirectoryIndex
 from proto_builder.tools.supported_languages import SUPPORTED_LANGUAGES
 
+try:
+    import zstandard
+except ImportError:  # optional, archives are gzip-compressed without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = frozenset(
+    ext for lang in SUPPORTED_LANGUAGES for ext in lang["extensions"]
+)
+
+# Number of characters (or image bytes) read at a time when streaming a value
+STREAM_CHUNK_SIZE = 64 * 1024
+
+LOG_ARCHIVE_SUFFIXES = (".tar.zst", ".tar.gz")
+LOG_ARCHIVE_SUFFIX = LOG_ARCHIVE_SUFFIXES[0 if zstandard is not None else 1]
+# Retention of archived logs, the oldest archives are deleted beyond these limits
+MAX_LOG_ARCHIVES = 20
+MAX_LOG_ARCHIVE_BYTES = 256 * 1024 * 1024
+
+# Sizes and modification times of the members of the archives listed last, by member name,
+# keyed by archive path and modification time. At most MAX_CACHED_ARCHIVES are kept.
+MAX_CACHED_ARCHIVES = 64
+_archive_members: "OrderedDict[Tuple[Path, int], Dict[str, Tuple[int, float]]]" = (
+    OrderedDict()
+)
+_archive_members_lock = threading.Lock()
+
+
+def _archive_stem(name: str) -> Optional[str]:
+    """The key prefix of a log archive file name, or None if it is not a log archive."""
+    if name.startswith("logs_"):
+        for suffix in LOG_ARCHIVE_SUFFIXES:
+            if name.endswith(suffix):
+                return name[: -len(suffix)]
+    return None
+
+
+def _archive_suffix(name: str) -> str:
+    return name[len(_archive_stem(name)) :]
+
+
+@contextmanager
+def _open_archive(path: Path, mode: str, suffix: str) -> Iterator[tarfile.TarFile]:
+    """
+    Open a log archive as a stream, reading (mode "r") or writing (mode "w") it sequentially.
+    """
+    if suffix == ".tar.zst":
+        if zstandard is None:
+            raise RuntimeError(f"The zstandard package is required to open {path}")
+        with open(path, mode + "b") as raw:
+            if mode == "r":
+                stream = zstandard.ZstdDecompressor().stream_reader(raw)
+            else:
+                stream = zstandard.ZstdCompressor().stream_writer(raw)
+            with stream, tarfile.open(fileobj=stream, mode=mode + "|") as tar:
+                yield tar
+    else:
+        with tarfile.open(str(path), mode + "|gz") as tar:
+            yield tar
+
+
+class _ArchiveCursor:
+    """
+    Reads members of log archives in archive order, keeping the current archive open so that
+    reading its members one after the other decompresses it once. The archive is reopened only
+    to read a member located before the current position.
+    """
+
+    def __init__(self):
+        self._stack: Optional[ExitStack] = None
+        self._archive: Optional[Path] = None
+
+    def open(self, archive: Path, name: str) -> Optional[IO[str]]:
+        """A text stream over a member, valid until the next call, or None if it is missing."""
+        for reopen in (self._archive != archive, True):
+            if reopen:
+                self.close()
+                self._stack = ExitStack()
+                self._tar = self._stack.enter_context(
+                    _open_archive(archive, "r", _archive_suffix(archive.name))
+                )
+                self._archive = archive
+                self._members = iter(self._tar)
+            for member in self._members:
+                if member.name == name and member.isfile():
+                    return codecs.getreader("utf-8")(self._tar.extractfile(member))
+        return None
+
+    def close(self) -> None:
+        if self._stack is not None:
+            self._stack.close()
+        self._stack = self._archive = None
+
+
+class LogWriter:
+    """
+    A background thread appending log entries to files in batches.
+
+    Entries are queued by `write` and appended by the writer thread, which opens each file
+    once per batch. A batch is written every `flush_interval` seconds, or earlier when
+    `flush` is called. The queue is bounded, so producers block instead of buffering without
+    limit if the disk cannot keep up.
+
+    Attributes
+    ----------
+    flush_interval : float
+        The maximum number of seconds an entry waits before being written.
+    """
+
+    def __init__(self, flush_interval: float = 0.5, max_queue_size: int = 1024):
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        # number of log files created by the writer, to invalidate directory listings
+        self.files_created = 0
+
+    def _ensure_thread(self) -> None:
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="disk-memory-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def write(self, path: Path, text: str) -> None:
+        """
+        Queue text to be appended to a file.
+
+        Parameters
+        ----------
+        path : Path
+            The file to append to, created with its parent directories if needed.
+        text : str
+            The text to append.
+        """
+        self._ensure_thread()
+        self._queue.put((path, text))
+
+    def flush(self) -> None:
+        """Block until every entry queued so far is written."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def _run(self) -> None:
+        pending: Dict[Path, List[str]] = defaultdict(list)
+        deadline = None  # when the oldest pending entry must be written
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, tuple):
+                pending[item[0]].append(item[1])
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if time.monotonic() < deadline:
+                    continue
+            try:
+                self._write(pending)
+            finally:
+                # a flush must never wait on a batch that failed
+                deadline = None
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write(self, pending: Dict[Path, List[str]]) -> None:
+        for path, texts in pending.items():
+            try:
+                if not path.exists():
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    self.files_created += 1
+                with open(path, "a", encoding="utf-8") as file:
+                    file.write("".join(texts))
+            except Exception as error:
+                # e.g. OSError, or UnicodeEncodeError for lone surrogates in model output;
+                # the writer thread must survive, as every later flush waits on it
+                logger.error(f"Could not write log {path}: {error}")
+        pending.clear()
+
+
+# Shared by every DiskMemory, so that the process runs a single writer thread
+LOG_WRITER = LogWriter()
+atexit.register(LOG_WRITER.flush)
+
 
 # This class represents a simple database that stores its tools as files in a directory.
 class DiskMemory(BaseMemory):
@@ -45,9 +253,18 @@ class DiskMemory(BaseMemory):
     ----------
     path : Path
         The directory path where the database files are stored.
+    max_log_archives : int
+        The maximum number of compressed log archives kept by `archive_logs`.
+    max_log_archive_bytes : int
+        The maximum total size of the compressed log archives kept by `archive_logs`.
     """
 
-    def __init__(self, path: Union[str, Path]):
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_log_archives: int = MAX_LOG_ARCHIVES,
+        max_log_archive_bytes: int = MAX_LOG_ARCHIVE_BYTES,
+    ):
         """
         Initialize the DiskMemory class with a specified path.
 
@@ -55,10 +272,26 @@ class DiskMemory(BaseMemory):
         ----------
         path : str or Path
             The path to the directory where the database files will be stored.
+        max_log_archives : int, optional
+            The maximum number of log archives kept by `archive_logs`.
+        max_log_archive_bytes : int, optional
+            The maximum total size of the log archives kept by `archive_logs`.
 
         """
         self.path: Path = Path(path).absolute()
         self.path.mkdir(parents=True, exist_ok=True)
+        self.max_log_archives = max_log_archives
+        self.max_log_archive_bytes = max_log_archive_bytes
+        self._index = DirectoryIndex(self.path)
+        # the keys derived from the index, with the index generation they were derived from
+        self._keys: Tuple[int, List[str]] = (-1, [])
+        self._log_files_created = LOG_WRITER.files_created
+
+    @staticmethod
+    def _flush_log(key: Union[str, Path]) -> None:
+        if str(key).startswith("logs"):
+            # entries of the log may still be queued
+            LOG_WRITER.flush()
 
     def __contains__(self, key: str) -> bool:
         """
@@ -75,7 +308,13 @@ class DiskMemory(BaseMemory):
             Returns True if the file exists, False otherwise.
 
         """
-        return (self.path / key).is_file()
+        self._flush_log(key)
+        if (self.path / key).is_file():
+            return True
+        archived = self._archived_log(key)
+        return archived is not None and archived[1] in self._archive_members(
+            archived[0]
+        )
 
     def __getitem__(self, key: str) -> str:
         """
@@ -99,8 +338,12 @@ class DiskMemory(BaseMemory):
             If the file corresponding to the key does not exist in the database.
         """
         full_path = self.path / key
+        self._flush_log(key)
 
         if not full_path.is_file():
+            if key in self:
+                with self.open_log(key) as f:
+                    return f.read()
             raise KeyError(f"File '{key}' could not be found in '{self.path}'")
 
         if full_path.suffix in [".png", ".jpeg", ".jpg"]:
@@ -126,20 +369,36 @@ class DiskMemory(BaseMemory):
         Returns
         -------
         Any
-            The content of the file if it exists, a new DiskMemory instance if the key corresponds to a directory.
+            The content of the file if it exists, including logs inside a log archive, a new
+            DiskMemory instance if the key corresponds to a directory, or a dictionary of the
+            archived logs if it corresponds to a log archive.
         """
 
         item_path = self.path / key
+        self._flush_log(key)
         try:
-            if item_path.is_file():
-                return self[key]
-            elif item_path.is_dir():
+            if item_path.is_dir():
                 return DiskMemory(item_path)
-            else:
-                return default
+            if key in self:
+                return self[key]
+            archive = self._log_archives().get(Path(key).as_posix())
+            if archive is not None:
+                return self._read_archive(archive)
+            return default
         except:
             return default
 
+    def _read_archive(self, archive: Path) -> Dict[str, str]:
+        # members are read in archive order, decompressing the archive once
+        cursor = _ArchiveCursor()
+        try:
+            return {
+                name: cursor.open(archive, name).read()
+                for name in self._archive_members(archive)
+            }
+        finally:
+            cursor.close()
+
     def __setitem__(self, key: Union[str, Path], val: str) -> None:
         """
         Set or update the content of a file in the database corresponding to the given key.
@@ -166,9 +425,12 @@ class DiskMemory(BaseMemory):
             raise TypeError("val must be str")
 
         full_path = self.path / key
+        is_new = not full_path.exists()
         full_path.parent.mkdir(parents=True, exist_ok=True)
 
         full_path.write_text(val, encoding="utf-8")
+        if is_new:
+            self._index.invalidate()
 
     def __delitem__(self, key: Union[str, Path]) -> None:
         """
@@ -186,6 +448,11 @@ class DiskMemory(BaseMemory):
 
         """
         item_path = self.path / key
+        archive = self._log_archives().get(str(key))
+        if archive is not None:
+            archive.unlink()
+            self._index.invalidate()
+            return
         if not item_path.exists():
             raise KeyError(f"Item '{key}' could not be found in '{self.path}'")
 
@@ -193,6 +460,7 @@ class DiskMemory(BaseMemory):
             item_path.unlink()
         elif item_path.is_dir():
             shutil.rmtree(item_path)
+        self._index.invalidate()
 
     def __iter__(self) -> Iterator[str]:
         """
@@ -204,13 +472,30 @@ class DiskMemory(BaseMemory):
             An iterator over the sorted list of keys (filenames) in the database.
 
         """
-        return iter(
-            sorted(
-                str(item.relative_to(self.path))
-                for item in sorted(self.path.rglob("*"))
-                if item.is_file()
-            )
-        )
+        return iter(self._list_keys())
+
+    def _list_keys(self) -> List[str]:
+        # queued log entries may create new log files
+        LOG_WRITER.flush()
+        if LOG_WRITER.files_created != self._log_files_created:
+            self._log_files_created = LOG_WRITER.files_created
+            self._index.invalidate()
+        files = self._index.files()
+        generation, keys = self._keys
+        if generation != self._index.generation:
+            keys = []
+            for name in files:
+                stem = None if os.sep in name else _archive_stem(name)
+                if stem is None:
+                    keys.append(name)
+                else:
+                    # archives are immutable once written, their listing is cached
+                    archive = self.path / name
+                    members = self._archive_members(archive)
+                    keys.extend(f"{stem}/{member}" for member in members)
+            keys.sort()
+            self._keys = (self._index.generation, keys)
+        return keys
 
     def __len__(self) -> int:
         """
@@ -222,22 +507,18 @@ class DiskMemory(BaseMemory):
             The number of files in the database.
 
         """
-        return len(list(self.__iter__()))
+        return len(self._list_keys())
 
     def _supported_files(self) -> str:
-        valid_extensions = {
-            ext for lang in SUPPORTED_LANGUAGES for ext in lang["extensions"]
-        }
         file_paths = [
-            str(item)
-            for item in self
-            if Path(item).is_file() and Path(item).suffix in valid_extensions
+            item
+            for item in self._list_keys()
+            if os.path.splitext(item)[1] in SUPPORTED_EXTENSIONS
         ]
         return "\n".join(file_paths)
 
     def _all_files(self) -> str:
-        file_paths = [str(item) for item in self if Path(item).is_file()]
-        return "\n".join(file_paths)
+        return "\n".join(self._list_keys())
 
     def to_path_list_string(self, supported_code_files_only: bool = False) -> str:
         """
@@ -272,17 +553,143 @@ class DiskMemory(BaseMemory):
         """
         return {file_path: self[file_path] for file_path in self}
 
-    def to_json(self) -> str:
+    def to_json(
+        self,
+        max_bytes: Optional[int] = None,
+        include: Optional[Callable[[str], bool]] = None,
+    ) -> str:
         """
         Serialize the database contents to a JSON string.
 
+        Parameters
+        ----------
+        max_bytes : int, optional
+            The approximate maximum size of the JSON string, as in `write_json`.
+        include : Callable[[str], bool], optional
+            A filter on the keys to serialize, as in `write_json`.
+
         Returns
         -------
         str
             A JSON string representation of the database contents.
 
         """
-        return json.dumps(self.to_dict())
+        buffer = io.StringIO()
+        self.write_json(buffer, max_bytes=max_bytes, include=include)
+        return buffer.getvalue()
+
+    def write_json(
+        self,
+        fp: IO[str],
+        max_bytes: Optional[int] = None,
+        include: Optional[Callable[[str], bool]] = None,
+    ) -> int:
+        """
+        Stream the database contents as a JSON object to a text stream.
+
+        Values are read and encoded chunk by chunk, so at most one chunk of one file is held in
+        memory, and each log archive is decompressed once for all its members. Without limit or
+        filter the output is identical to `json.dumps(self.to_dict())`.
+        To stream to a socket, pass `socket.makefile("w")`.
+
+        Parameters
+        ----------
+        fp : IO[str]
+            The text stream to write to.
+        max_bytes : int, optional
+            The approximate maximum size of the output. Files whose size on disk exceeds the
+            remaining budget are skipped, so the output stays valid JSON; escaping can make
+            the output slightly larger than the budget.
+        include : Callable[[str], bool], optional
+            A filter on the keys, only the keys for which it returns True are written.
+
+        Returns
+        -------
+        int
+            The number of characters written.
+        """
+        written = fp.write("{")
+        first = True
+        cursor = _ArchiveCursor()
+        try:
+            for key in self:
+                if include is not None and not include(key):
+                    continue
+                prefix = ("" if first else ", ") + json.dumps(key) + ": "
+                if max_bytes is not None:
+                    budget = max_bytes - written - len(prefix) - 3  # quotes and closing brace
+                    if self._stored_size(key) > budget:
+                        logger.debug(f"Skipping {key} in JSON output, size cap reached")
+                        continue
+                first = False
+                written += fp.write(prefix + '"')
+                for chunk in self._iter_json_chunks(key, cursor):
+                    # ensure_ascii escaping, as json.dumps does by default, strips the quotes
+                    written += fp.write(json.encoder.encode_basestring_ascii(chunk)[1:-1])
+                written += fp.write('"')
+        finally:
+            cursor.close()
+        written += fp.write("}")
+        return written
+
+    def _iter_json_chunks(self, key: str, cursor: _ArchiveCursor) -> Iterator[str]:
+        archived = None if (self.path / key).is_file() else self._archived_log(key)
+        stream = cursor.open(*archived) if archived is not None else None
+        if stream is None:
+            yield from self.iter_chunks(key)
+            return
+        while chunk := stream.read(STREAM_CHUNK_SIZE):
+            yield chunk
+
+    def _stored_size(self, key: str) -> int:
+        full_path = self.path / key
+        if full_path.is_file():
+            size = full_path.stat().st_size
+            if full_path.suffix in [".png", ".jpeg", ".jpg"]:
+                size = size * 4 // 3
+            return size
+        archived = self._archived_log(key)
+        if archived is not None:
+            archive, name = archived
+            return self._archive_members(archive).get(name, (0, 0.0))[0]
+        return 0
+
+    def iter_chunks(
+        self, key: Union[str, Path], chunk_size: int = STREAM_CHUNK_SIZE
+    ) -> Iterator[str]:
+        """
+        Iterate over the content of a file in chunks, yielding what `__getitem__` returns.
+
+        Parameters
+        ----------
+        key : str or Path
+            The key (filename) whose content is to be streamed.
+        chunk_size : int, optional
+            The number of characters, or image bytes, read at a time.
+
+        Yields
+        ------
+        str
+            Consecutive chunks of the content; images are Base64-encoded data URLs.
+
+        Raises
+        ------
+        KeyError
+            If the file corresponding to the key does not exist in the database.
+        """
+        full_path = self.path / key
+        if full_path.is_file() and full_path.suffix in [".png", ".jpeg", ".jpg"]:
+            mime_type = "image/png" if full_path.suffix == ".png" else "image/jpeg"
+            yield f"data:{mime_type};base64,"
+            # a multiple of 3 bytes encodes without padding, so the chunks concatenate
+            chunk_size = max(3, chunk_size - chunk_size % 3)
+            with full_path.open("rb") as image_file:
+                while data := image_file.read(chunk_size):
+                    yield base64.b64encode(data).decode("utf-8")
+            return
+        with self.open_log(key) as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
 
     def log(self, key: Union[str, Path], val: str) -> None:
         """
@@ -296,33 +703,132 @@ class DiskMemory(BaseMemory):
             The content to be appended to the file.
 
         """
-        print("==== Logging to:\n", key)
-
         if str(key).startswith("../"):
             raise ValueError(f"File name {key} attempted to access parent path.")
 
         if not isinstance(val, str):
             raise TypeError("val must be str")
 
-        print("==== Logging to:\n", self.path)
+        logger.debug(f"Logging to {key} in {self.path}")
         full_path = self.path / "logs" / key
-        full_path.parent.mkdir(parents=True, exist_ok=True)
-
-        # Touch if it doesnt exist
-        if not full_path.exists():
-            full_path.touch()
-
-        with open(full_path, "a", encoding="utf-8") as file:
-            file.write(f"\n{datetime.now().isoformat()}\n")
-            file.write(val + "\n")
+        # the timestamp is taken now, the entry is appended by the background writer
+        LOG_WRITER.write(full_path, f"\n{datetime.now().isoformat()}\n{val}\n")
 
     def archive_logs(self):
         """
-        Moves all logs to archive directory based on current timestamp
+        Moves all logs to a compressed archive based on current timestamp, then deletes the
+        oldest archives beyond `max_log_archives` archives or `max_log_archive_bytes` bytes.
+        """
+        LOG_WRITER.flush()
+        logs_dir = self.path / "logs"
+        if not logs_dir.is_dir():
+            return
+        stem = f"logs_{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}"
+        archive = self.path / f"{stem}{LOG_ARCHIVE_SUFFIX}"
+        suffix = 1
+        while archive.exists():
+            archive = self.path / f"{stem}-{suffix}{LOG_ARCHIVE_SUFFIX}"
+            suffix += 1
+        tmp_path = archive.with_name(archive.name + ".tmp")
+        with _open_archive(tmp_path, "w", LOG_ARCHIVE_SUFFIX) as tar:
+            for item in sorted(logs_dir.rglob("*")):
+                if item.is_file():
+                    tar.add(item, arcname=item.relative_to(logs_dir).as_posix())
+        os.replace(tmp_path, archive)
+        shutil.rmtree(logs_dir)
+        self._prune_log_archives()
+        self._index.invalidate()
+
+    def _prune_log_archives(self) -> None:
+        archives = sorted(self._log_archives().items())
+        sizes = [archive.stat().st_size for _, archive in archives]
+        # the newest archive is always kept
+        while len(archives) > 1 and (
+            len(archives) > self.max_log_archives
+            or sum(sizes) > self.max_log_archive_bytes
+        ):
+            _, oldest = archives.pop(0)
+            sizes.pop(0)
+            logger.info(f"Deleting log archive {oldest.name}")
+            oldest.unlink()
+
+    def _log_archives(self) -> Dict[str, Path]:
+        """The log archive files of the memory, keyed by their key prefix."""
+        archives = {}
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                stem = _archive_stem(entry.name)
+                if stem is not None and entry.is_file():
+                    archives[stem] = Path(entry.path)
+        return archives
+
+    @staticmethod
+    def _archive_members(archive: Path) -> Dict[str, Tuple[int, float]]:
+        """The files of a log archive, mapping their names to their size and modification time."""
+        cache_key = (archive, archive.stat().st_mtime_ns)
+        with _archive_members_lock:
+            members = _archive_members.get(cache_key)
+            if members is not None:
+                _archive_members.move_to_end(cache_key)
+                return members
+        with _open_archive(archive, "r", _archive_suffix(archive.name)) as tar:
+            members = {
+                member.name: (member.size, member.mtime)
+                for member in tar
+                if member.isfile()
+            }
+        with _archive_members_lock:
+            _archive_members[cache_key] = members
+            while len(_archive_members) > MAX_CACHED_ARCHIVES:
+                _archive_members.popitem(last=False)
+        return members
+
+    def _archived_log(self, key: Union[str, Path]) -> Optional[Tuple[Path, str]]:
+        stem, _, name = Path(key).as_posix().partition("/")
+        if not name or not stem.startswith("logs_"):
+            return None
+        for suffix in LOG_ARCHIVE_SUFFIXES:
+            archive = self.path / f"{stem}{suffix}"
+            if archive.is_file():
+                return archive, name
+        return None
+
+    @contextmanager
+    def open_log(self, key: Union[str, Path]) -> Iterator[IO[str]]:
         """
-        if "logs" in self:
-            archive_dir = (
-                self.path / f"logs_{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}"
-            )
-            shutil.move(self.path / "logs", archive_dir)
+        Open a log for reading, decompressing it as it is read if it is archived.
+
+        Parameters
+        ----------
+        key : str or Path
+            The key of the log, such as "logs/improve.txt" or "logs_<timestamp>/improve.txt".
+
+        Yields
+        ------
+        IO[str]
+            A text stream over the content of the log.
+
+        Raises
+        ------
+        KeyError
+            If the log does not exist.
+        """
+        full_path = self.path / key
+        if str(key).startswith("logs"):
+            # entries of the log may still be queued
+            LOG_WRITER.flush()
+        if full_path.is_file():
+            with full_path.open("r", encoding="utf-8") as f:
+                yield f
+            return
+        archived = self._archived_log(key)
+        if archived is not None:
+            archive, name = archived
+            with _open_archive(archive, "r", _archive_suffix(archive.name)) as tar:
+                for member in tar:
+                    if member.name == name and member.isfile():
+                        # stream-mode members are not seekable, which TextIOWrapper requires
+                        yield codecs.getreader("utf-8")(tar.extractfile(member))
+                        return
+        raise KeyError(f"File '{key}' could not be found in '{self.path}'")
 
@@ -1,11 +1,30 @@
+import codecs
+import json
+import os
+import shutil
 import tempfile
 import logging
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Union
+from typing import Dict, Iterable, Optional, Union
 
-from proto_builder.core.files_dict import FilesDict
-from proto_builder.core.linting import Linting
+from proto_builder.core.default.constants import IGNORE_FOLDERS
+from proto_builder.core.default.paths import filestore_manifest_path
+from proto_builder.core.files_dict import FilesDict, LazyFilesDict, content_digest
+from proto_builder.core.formatters import ExternalFormatter
+from proto_builder.core.linting import Linting, default_lint_cache
+from proto_builder.core.response_cache import ResponseCache
+
+# Folders not collected by `FileStore.pull`: dependencies, virtualenvs and version control
+PULL_IGNORE_FOLDERS = IGNORE_FOLDERS | {".git", ".venv"}
+# Maximum number of push manifests kept in the user cache, the least recently used are deleted
+MAX_MANIFESTS = 256
+# Number of leading bytes inspected to tell text from binary files
+BINARY_SNIFF_BYTES = 8192
+# The content reported for binary files
+BINARY_PLACEHOLDER = "binary file"
 
 
 class FileStore:
@@ -16,6 +35,15 @@ class FileStore:
     It includes methods for uploading files to the directory and downloading them as a
     collection of files.
 
+    Pushes are incremental: a manifest, kept in the user cache directory so that it is never
+    copied with the working directory, maps every pushed file to the digest, size and
+    modification time it was written with. Files whose digest did not
+    change and that were not modified on disk since are skipped, files that were pushed
+    before but are no longer part of the pushed files are deleted, and every write goes to
+    a temporary file renamed into place, so a running program never reads a partial file.
+    The manifest of a temporary working directory created by the store lives in memory
+    only, and at most `MAX_MANIFESTS` manifests are kept in the user cache.
+
     Classes
     -------
     FileStore
@@ -30,6 +58,8 @@ class FileStore:
     """
 
     def __init__(self, path: Union[str, Path, None] = None):
+        # the manifest of a fresh temporary directory is of no use to later runs
+        self._persist_manifest = path is not None
         if path is None:
             print("==== Creating temp directory as path is None")
             path = Path(tempfile.mkdtemp(prefix="proto-builder-"))
@@ -40,29 +70,239 @@ class FileStore:
         self.working_dir = Path(path)
         self.working_dir.mkdir(parents=True, exist_ok=True)
         self.id = self.working_dir.name.split("-")[-1]
+        self.manifest_path = Path(filestore_manifest_path(self.working_dir))
+        # [digest, size, mtime_ns] of the content last written by a push, keyed by file name
+        self._manifest: Dict[str, list] = self._load_manifest()
+        self.files_written = 0
+        self.files_skipped = 0
+        self.files_deleted = 0
+        self.bytes_written = 0
+        self.last_push_written = 0
+        self.last_push_deleted = 0
+        self.last_push_bytes = 0
+
+    def _load_manifest(self) -> Dict[str, list]:
+        if not self._persist_manifest:
+            return {}
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            # marks the manifest as recently used
+            os.utime(self.manifest_path)
+            return manifest
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self) -> None:
+        if not self._persist_manifest:
+            return
+        try:
+            self._write_atomic(
+                self.manifest_path, json.dumps(self._manifest).encode("utf-8")
+            )
+            self._prune_manifests()
+        except OSError as error:
+            # the manifest only saves work, the next push rewrites the files instead
+            logging.warning(f"Could not save the push manifest: {error}")
+
+    def _prune_manifests(self) -> None:
+        manifests = []
+        with os.scandir(self.manifest_path.parent) as entries:
+            for entry in entries:
+                if entry.name.endswith(".json") and entry.is_file():
+                    try:
+                        manifests.append((entry.stat().st_mtime, entry.path))
+                    except FileNotFoundError:
+                        continue  # pruned by another process meanwhile
+        manifests.sort()
+        for _, path in manifests[: max(len(manifests) - MAX_MANIFESTS, 0)]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> os.stat_result:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            try:
+                # replacing a file keeps its mode, e.g. executable scripts, as rewriting
+                # it in place did
+                shutil.copymode(path, tmp_path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+        finally:
+            # only left behind when the write or the rename failed
+            try:
+                tmp_path.unlink()
+            except FileNotFoundError:
+                pass
+        return os.stat(path)
+
+    def _prune_empty_parents(self, path: Path) -> None:
+        # remove the directories left empty by a deletion, up to the working directory
+        for parent in path.parents:
+            if parent == self.working_dir or self.working_dir not in parent.parents:
+                return
+            try:
+                parent.rmdir()
+            except OSError:
+                return
+
+    def _is_current(self, name: str, digest: str, path: Path) -> bool:
+        entry = self._manifest.get(name)
+        if entry is None or entry[0] != digest:
+            return False
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        # the file may have been modified by the code running in the working directory
+        return [stat.st_size, stat.st_mtime_ns] == entry[1:]
 
     def push(self, files: FilesDict):
         logging.info(f"==== Pushing files to: {self.working_dir}")
+        written = skipped = deleted = bytes_written = 0
         for name, content in files.items():
+            if isinstance(files, FilesDict):
+                digest = files.content_digest(name)
+            else:
+                digest = content_digest(content)
             path = self.working_dir / name
-            path.parent.mkdir(parents=True, exist_ok=True)
-            with open(path, "w") as f:
-                f.write(content)
+            if self._is_current(str(name), digest, path):
+                skipped += 1
+                continue
+            data = content.encode("utf-8")
+            stat = self._write_atomic(path, data)
+            self._manifest[str(name)] = [digest, stat.st_size, stat.st_mtime_ns]
+            written += 1
+            bytes_written += len(data)
+
+        pushed = {str(name) for name in files}
+        removed = [name for name in self._manifest if name not in pushed]
+        for name in removed:
+            try:
+                (self.working_dir / name).unlink()
+                deleted += 1
+            except FileNotFoundError:
+                pass
+            del self._manifest[name]
+            self._prune_empty_parents(self.working_dir / name)
+
+        if written or removed:
+            self._save_manifest()
+        self.files_written += written
+        self.files_skipped += skipped
+        self.files_deleted += deleted
+        self.bytes_written += bytes_written
+        self.last_push_written = written
+        self.last_push_deleted = deleted
+        self.last_push_bytes = bytes_written
+        logging.info(
+            f"==== Wrote {written} files ({bytes_written} bytes), "
+            f"skipped {skipped} unchanged files, deleted {deleted} removed files"
+        )
         return self
 
-    def linting(self, files: FilesDict) -> FilesDict:
-        # lint the code
-        linting = Linting()
+    def linting(
+        self,
+        files: FilesDict,
+        cache: Optional[ResponseCache] = None,
+        formatters: Optional[Dict[str, ExternalFormatter]] = None,
+    ) -> FilesDict:
+        # lint the code, reusing the contents linted in earlier runs, by default through the
+        # lint cache of the user; the files of other languages are only formatted when
+        # external formatters are given, such as `FORMATTERS`
+        linting = Linting(
+            cache=default_lint_cache() if cache is None else cache,
+            formatters=formatters,
+        )
         return linting.lint_files(files)
 
-    def pull(self) -> FilesDict:
-        files = {}
-        for path in self.working_dir.glob("**/*"):
-            if path.is_file():
-                with open(path, "r") as f:
-                    try:
-                        content = f.read()
-                    except UnicodeDecodeError:
-                        content = "binary file"
-                    files[str(path.relative_to(self.working_dir))] = content
-        return FilesDict(files)
+    def pull(
+        self,
+        ignore_folders: Optional[Iterable[str]] = None,
+        max_workers: Optional[int] = None,
+    ) -> LazyFilesDict:
+        """
+        Collect the files of the working directory.
+
+        The directory is walked with `os.scandir`, without descending into ignored folders.
+        The first bytes of every file are read on a thread pool to tell text from binary
+        files; binary files read as "binary file" and the contents of text files are only
+        read when accessed, or in parallel through `LazyFilesDict.load`.
+
+        Parameters
+        ----------
+        ignore_folders : Iterable[str], optional
+            The names of the folders to skip, by default `PULL_IGNORE_FOLDERS`.
+        max_workers : int, optional
+            The number of threads reading files, by default chosen by ThreadPoolExecutor.
+
+        Returns
+        -------
+        LazyFilesDict
+            The files of the working directory, keyed by their relative path.
+        """
+        ignore_folders = frozenset(
+            PULL_IGNORE_FOLDERS if ignore_folders is None else ignore_folders
+        )
+        paths = []
+        pending = [str(self.working_dir)]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in ignore_folders:
+                                pending.append(entry.path)
+                        elif entry.is_file():
+                            paths.append(entry.path)
+            except OSError as error:
+                # e.g. a directory the user cannot read, skipped as by a glob
+                logging.debug(f"Skipping {directory}: {error}")
+        paths.sort()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            is_text = list(executor.map(_is_text_file, paths))
+        loaders = {
+            os.path.relpath(path, self.working_dir): (
+                partial(_read_text_file, path) if text else _binary_placeholder
+            )
+            for path, text in zip(paths, is_text)
+        }
+        return LazyFilesDict(loaders, max_workers=max_workers)
+
+
+def _is_text_file(path: str) -> bool:
+    """Sniff whether a file is UTF-8 text from its first bytes."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(BINARY_SNIFF_BYTES)
+    except OSError:
+        return False
+    if b"\0" in head:
+        return False
+    try:
+        # the sniffed block may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _read_text_file(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return BINARY_PLACEHOLDER
+
+
+def _binary_placeholder() -> str:
+    return BINARY_PLACEHOLDER
@@ -13,6 +13,22 @@ META_DATA_REL_PATH : str
 MEMORY_REL_PATH : str
     The relative path to the directory where memory-related files are stored.
 
+USER_CACHE_PATH : Path
+    The per-user directory where caches shared by all projects are stored, outside of the
+    project directories copied to the execution environments.
+
+RESPONSE_CACHE_REL_PATH : str
+    The path, relative to `USER_CACHE_PATH`, of the directory where cached model responses
+    are stored.
+
+FILESTORE_MANIFEST_REL_PATH : str
+    The path, relative to `USER_CACHE_PATH`, of the directory where the manifests of the files
+    pushed to working directories are stored.
+
+LINT_CACHE_REL_PATH : str
+    The path, relative to `USER_CACHE_PATH`, of the directory where linted file contents
+    are stored.
+
 CODE_GEN_LOG_FILE : str
     The filename for the log file that contains all output from code generation.
 
@@ -35,13 +51,32 @@ memory_path : function
 
 metadata_path : function
     Constructs the full path to the metadata directory based on a given base path.
+
+response_cache_path : function
+    Constructs the full path to the response cache directory, in the user cache directory
+    by default.
+
+filestore_manifest_path : function
+    Constructs the full path to the push manifest of a working directory, in the user cache
+    directory by default.
+
+lint_cache_path : function
+    Constructs the full path to the lint cache directory, in the user cache directory by
+    default.
 """
+import hashlib
 import os
 
 from pathlib import Path
 
 META_DATA_REL_PATH = "proto-builder"
 MEMORY_REL_PATH = os.path.join(META_DATA_REL_PATH, "memory")
+USER_CACHE_PATH = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / META_DATA_REL_PATH
+)
+RESPONSE_CACHE_REL_PATH = "response_cache"
+FILESTORE_MANIFEST_REL_PATH = "filestore_manifests"
+LINT_CACHE_REL_PATH = "lint_cache"
 CODE_GEN_LOG_FILE = "all_output.txt"
 IMPROVE_LOG_FILE = "improve.txt"
 DIFF_LOG_FILE = "diff_errors.txt"
@@ -84,3 +119,60 @@ def metadata_path(path):
         The full path to the metadata directory.
     """
     return os.path.join(path, META_DATA_REL_PATH)
+
+
+def response_cache_path(path=None):
+    """
+    Constructs the full path to the response cache directory based on a given base path.
+
+    Parameters
+    ----------
+    path : str, optional
+        The base path to append the response cache directory to, `USER_CACHE_PATH` by
+        default.
+
+    Returns
+    -------
+    str
+        The full path to the response cache directory.
+    """
+    return os.path.join(path or USER_CACHE_PATH, RESPONSE_CACHE_REL_PATH)
+
+
+def filestore_manifest_path(working_dir, path=None):
+    """
+    Constructs the full path to the push manifest of a working directory.
+
+    Parameters
+    ----------
+    working_dir : str
+        The working directory the manifest describes, identified by its absolute path.
+    path : str, optional
+        The base path to append the manifest directory to, `USER_CACHE_PATH` by default.
+
+    Returns
+    -------
+    str
+        The full path to the manifest file.
+    """
+    key = hashlib.sha256(os.fsencode(os.path.abspath(working_dir))).hexdigest()
+    return os.path.join(
+        path or USER_CACHE_PATH, FILESTORE_MANIFEST_REL_PATH, f"{key}.json"
+    )
+
+
+def lint_cache_path(path=None):
+    """
+    Constructs the full path to the lint cache directory based on a given base path.
+
+    Parameters
+    ----------
+    path : str, optional
+        The base path to append the lint cache directory to, `USER_CACHE_PATH` by default.
+
+    Returns
+    -------
+    str
+        The full path to the lint cache directory.
+    """
+    return os.path.join(path or USER_CACHE_PATH, LINT_CACHE_REL_PATH)
@@ -0,0 +1,553 @@
+"""
+SQLite Memory Module
+====================
+
+This module provides a key-value store with the same interface as `DiskMemory`, backed by a single
+SQLite database instead of one file per key. The database runs in WAL mode, so readers never block the
+writer, and many sessions can share it without the filesystem metadata traffic of creating, appending
+to and walking thousands of small files. Log entries are buffered in memory and appended in batches.
+
+Keys are exposed exactly as `DiskMemory` exposes them: stored files under their own name, current logs
+under "logs/<name>" and archived logs under "logs_<timestamp>/<name>".
+
+Functions
+---------
+migrate_disk_memory(source, target) -> int
+    Copy the files and logs of a `DiskMemory` directory into a `SqliteMemory`.
+
+Classes
+-------
+SqliteMemory
+    A SQLite-backed key-value store where keys correspond to filenames and values to file contents.
+"""
+
+import argparse
+import io
+import json
+import sqlite3
+import threading
+import time
+import weakref
+
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from proto_builder.core.base_memory import BaseMemory
+from proto_builder.core.default.disk_memory import SUPPORTED_EXTENSIONS, DiskMemory
+
+LOGS_ARCHIVE = "logs"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    archive TEXT NOT NULL,
+    key TEXT NOT NULL,
+    created TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS logs_by_key ON logs (archive, key, id);
+"""
+
+
+def _flush(connection: sqlite3.Connection, pending: List[Tuple], lock) -> None:
+    with lock:
+        if not pending:
+            return
+        with connection:
+            connection.executemany(
+                "INSERT INTO logs (archive, key, created, value) VALUES (?, ?, ?, ?)",
+                pending,
+            )
+        pending.clear()
+
+
+def _close(connection: sqlite3.Connection, pending: List[Tuple], lock) -> None:
+    try:
+        _flush(connection, pending, lock)
+    finally:
+        connection.close()
+
+
+class SqliteMemory(BaseMemory):
+    """
+    A SQLite-backed key-value store where keys correspond to filenames and values to file contents.
+
+    Calls to `log` are buffered and written in a single transaction once `batch_size` entries are
+    pending or `flush_interval` seconds have passed since the last write. Pending entries are also
+    written before every read, on `archive_logs`, on `close` and when the process exits.
+
+    Attributes
+    ----------
+    path : Path
+        The path of the database file.
+    batch_size : int
+        The number of pending log entries triggering a write.
+    flush_interval : float
+        The maximum number of seconds a log entry stays pending, checked on every `log` call.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        batch_size: int = 64,
+        flush_interval: float = 1.0,
+    ):
+        """
+        Initialize the SqliteMemory class with a specified database file.
+
+        Parameters
+        ----------
+        path : str or Path
+            The path of the database file, created if it does not exist.
+        batch_size : int, optional
+            The number of pending log entries triggering a write, by default 64.
+        flush_interval : float, optional
+            The maximum age in seconds of pending log entries, by default 1.0.
+        """
+        self.path: Path = Path(path).absolute()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # writes are committed by the connection context manager, one transaction per batch
+        self._connection = sqlite3.connect(
+            str(self.path), timeout=30, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._pending: List[Tuple[str, str, str, str]] = []
+        self._last_flush = time.monotonic()
+        # flushes pending logs when the memory is garbage collected or the process exits
+        self._finalizer = weakref.finalize(
+            self, _close, self._connection, self._pending, self._lock
+        )
+
+    def _query(self, sql: str, parameters: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            _flush(self._connection, self._pending, self._lock)
+            return self._connection.execute(sql, parameters).fetchall()
+
+    @staticmethod
+    def _split_log_key(key: Union[str, Path]) -> Optional[Tuple[str, str]]:
+        # "logs/<name>" and "logs_<timestamp>/<name>" address log entries
+        archive, _, name = str(key).partition("/")
+        if name and (archive == LOGS_ARCHIVE or archive.startswith(LOGS_ARCHIVE + "_")):
+            return archive, name
+        return None
+
+    def __contains__(self, key: Union[str, Path]) -> bool:
+        """
+        Determine whether the database contains a file with the specified key.
+
+        Parameters
+        ----------
+        key : str
+            The key (filename) to check for existence in the database.
+
+        Returns
+        -------
+        bool
+            Returns True if the file exists, False otherwise.
+        """
+        if self._query("SELECT 1 FROM files WHERE key = ?", (str(key),)):
+            return True
+        log_key = self._split_log_key(key)
+        return bool(
+            log_key
+            and self._query(
+                "SELECT 1 FROM logs WHERE archive = ? AND key = ? LIMIT 1", log_key
+            )
+        )
+
+    def __getitem__(self, key: Union[str, Path]) -> str:
+        """
+        Retrieve the content of a file in the database corresponding to the given key.
+
+        Parameters
+        ----------
+        key : str
+            The key (filename) whose content is to be retrieved.
+
+        Returns
+        -------
+        str
+            The content of the file, or the concatenated entries of a log.
+
+        Raises
+        ------
+        KeyError
+            If the key does not exist in the database.
+        """
+        rows = self._query("SELECT value FROM files WHERE key = ?", (str(key),))
+        if rows:
+            return rows[0][0]
+        log_key = self._split_log_key(key)
+        if log_key:
+            rows = self._query(
+                "SELECT value FROM logs WHERE archive = ? AND key = ? ORDER BY id",
+                log_key,
+            )
+            if rows:
+                return "".join(row[0] for row in rows)
+        raise KeyError(f"File '{key}' could not be found in '{self.path}'")
+
+    def get(self, key: Union[str, Path], default: Optional[Any] = None) -> Any:
+        """
+        Retrieve the content of a file in the database, or return a default value if not found.
+
+        Parameters
+        ----------
+        key : str
+            The key (filename) whose content is to be retrieved.
+        default : Any, optional
+            The default value to return if the file does not exist. Default is None.
+
+        Returns
+        -------
+        Any
+            The content of the file if it exists, the default value otherwise.
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key: Union[str, Path], val: str) -> None:
+        """
+        Set or update the content of a file in the database corresponding to the given key.
+
+        Parameters
+        ----------
+        key : str or Path
+            The key (filename) where the content is to be set.
+        val : str
+            The content to be written to the file.
+
+        Raises
+        ------
+        ValueError
+            If the key attempts to access a parent path.
+        TypeError
+            If the value is not a string.
+        """
+        if str(key).startswith("../"):
+            raise ValueError(f"File name {key} attempted to access parent path.")
+
+        if not isinstance(val, str):
+            raise TypeError("val must be str")
+
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO files (key, value) VALUES (?, ?)", (str(key), val)
+            )
+
+    def __delitem__(self, key: Union[str, Path]) -> None:
+        """
+        Delete a file, or every file below a directory, corresponding to the given key.
+
+        Parameters
+        ----------
+        key : str or Path
+            The key (filename or directory name) to be deleted.
+
+        Raises
+        ------
+        KeyError
+            If no file corresponds to the key.
+        """
+        key = str(key)
+        prefix = key.rstrip("/") + "/"
+        with self._lock:
+            _flush(self._connection, self._pending, self._lock)
+            with self._connection:
+                deleted = self._connection.execute(
+                    "DELETE FROM files WHERE key = ? OR substr(key, 1, ?) = ?",
+                    (key, len(prefix), prefix),
+                ).rowcount
+                log_key = self._split_log_key(key)
+                if log_key:
+                    deleted += self._connection.execute(
+                        "DELETE FROM logs WHERE archive = ? AND key = ?", log_key
+                    ).rowcount
+                elif self._split_log_key(prefix + "*"):
+                    # a whole log directory such as "logs" or "logs_<timestamp>"
+                    deleted += self._connection.execute(
+                        "DELETE FROM logs WHERE archive = ?", (key.rstrip("/"),)
+                    ).rowcount
+        if not deleted:
+            raise KeyError(f"Item '{key}' could not be found in '{self.path}'")
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Iterate over the keys (filenames) in the database.
+
+        Yields
+        ------
+        Iterator[str]
+            An iterator over the sorted list of keys (filenames) in the database.
+        """
+        rows = self._query(
+            "SELECT key FROM files UNION SELECT DISTINCT archive || '/' || key FROM logs "
+            "ORDER BY 1"
+        )
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        """
+        Get the number of files in the database.
+
+        Returns
+        -------
+        int
+            The number of files in the database.
+        """
+        rows = self._query(
+            "SELECT COUNT(*) FROM (SELECT key FROM files "
+            "UNION SELECT archive || '/' || key FROM logs)"
+        )
+        return rows[0][0]
+
+    def _supported_files(self) -> str:
+        file_paths = [
+            str(item) for item in self if Path(item).suffix in SUPPORTED_EXTENSIONS
+        ]
+        return "\n".join(file_paths)
+
+    def _all_files(self) -> str:
+        return "\n".join(str(item) for item in self)
+
+    def to_path_list_string(self, supported_code_files_only: bool = False) -> str:
+        """
+        Generate a string representation of the file paths in the database.
+
+        Parameters
+        ----------
+        supported_code_files_only : bool, optional
+            If True, filter the list to include only supported code file extensions.
+            Default is False.
+
+        Returns
+        -------
+        str
+            A newline-separated string of file paths.
+        """
+        if supported_code_files_only:
+            return self._supported_files()
+        else:
+            return self._all_files()
+
+    def to_dict(self) -> Dict[Union[str, Path], str]:
+        """
+        Convert the database contents to a dictionary.
+
+        Returns
+        -------
+        Dict[Union[str, Path], str]
+            A dictionary with keys as filenames and values as file contents.
+        """
+        return {file_path: self[file_path] for file_path in self}
+
+    def to_json(
+        self,
+        max_bytes: Optional[int] = None,
+        include: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """
+        Serialize the database contents to a JSON string.
+
+        Parameters
+        ----------
+        max_bytes : int, optional
+            The approximate maximum size of the JSON string, as in `write_json`.
+        include : Callable[[str], bool], optional
+            A filter on the keys to serialize, as in `write_json`.
+
+        Returns
+        -------
+        str
+            A JSON string representation of the database contents.
+        """
+        buffer = io.StringIO()
+        self.write_json(buffer, max_bytes=max_bytes, include=include)
+        return buffer.getvalue()
+
+    def write_json(
+        self,
+        fp: IO[str],
+        max_bytes: Optional[int] = None,
+        include: Optional[Callable[[str], bool]] = None,
+    ) -> int:
+        """
+        Write the database contents as a JSON object to a text stream.
+
+        Behaves as `DiskMemory.write_json`: without limit or filter the output is identical to
+        `json.dumps(self.to_dict())`.
+
+        Parameters
+        ----------
+        fp : IO[str]
+            The text stream to write to.
+        max_bytes : int, optional
+            The approximate maximum size of the output. Values whose UTF-8 size exceeds the
+            remaining budget are skipped, so the output stays valid JSON; escaping can make
+            the output slightly larger than the budget.
+        include : Callable[[str], bool], optional
+            A filter on the keys, only the keys for which it returns True are written.
+
+        Returns
+        -------
+        int
+            The number of characters written.
+        """
+        written = fp.write("{")
+        first = True
+        for key in self:
+            if include is not None and not include(key):
+                continue
+            value = self[key]
+            prefix = ("" if first else ", ") + json.dumps(key) + ": "
+            if max_bytes is not None:
+                budget = max_bytes - written - len(prefix) - 3  # quotes and closing brace
+                if len(value.encode("utf-8")) > budget:
+                    continue
+            first = False
+            written += fp.write(prefix + json.dumps(value))
+        written += fp.write("}")
+        return written
+
+    def log(self, key: Union[str, Path], val: str) -> None:
+        """
+        Append an entry to a log, written with the next batch.
+
+        Parameters
+        ----------
+        key : str or Path
+            The name of the log.
+        val : str
+            The content to be appended to the log.
+        """
+        if str(key).startswith("../"):
+            raise ValueError(f"File name {key} attempted to access parent path.")
+
+        if not isinstance(val, str):
+            raise TypeError("val must be str")
+
+        created = datetime.now().isoformat()
+        with self._lock:
+            # stored with the same framing DiskMemory writes to its log files
+            self._pending.append((LOGS_ARCHIVE, str(key), created, f"\n{created}\n{val}\n"))
+            now = time.monotonic()
+            if (
+                len(self._pending) >= self.batch_size
+                or now - self._last_flush >= self.flush_interval
+            ):
+                self.flush()
+
+    def flush(self) -> None:
+        """Write the pending log entries in a single transaction."""
+        with self._lock:
+            _flush(self._connection, self._pending, self._lock)
+            self._last_flush = time.monotonic()
+
+    def archive_logs(self):
+        """
+        Moves all logs to archive directory based on current timestamp
+        """
+        stem = f"{LOGS_ARCHIVE}_{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}"
+        with self._lock:
+            self.flush()
+            # numbered as DiskMemory does, so that archiving twice in a second does not
+            # merge into the previous archive
+            archive = stem
+            suffix = 1
+            while self._connection.execute(
+                "SELECT 1 FROM logs WHERE archive = ? LIMIT 1", (archive,)
+            ).fetchone():
+                archive = f"{stem}-{suffix}"
+                suffix += 1
+            with self._connection:
+                self._connection.execute(
+                    "UPDATE logs SET archive = ? WHERE archive = ?", (archive, LOGS_ARCHIVE)
+                )
+
+    def close(self) -> None:
+        """Write the pending log entries and close the database."""
+        self._finalizer()
+
+
+def _modified_time(memory: DiskMemory, key: str) -> float:
+    # archived logs only exist as members of their "logs_<timestamp>" archive
+    path = memory.path / key
+    if path.is_file():
+        return path.stat().st_mtime
+    archive, name = memory._archived_log(key)
+    members = memory._archive_members(archive)
+    if name in members:
+        return members[name][1]
+    return archive.stat().st_mtime
+
+
+def migrate_disk_memory(source: Union[str, Path], target: SqliteMemory) -> int:
+    """
+    Copy the files and logs of a `DiskMemory` directory into a `SqliteMemory`.
+
+    Files below "logs" and "logs_<timestamp>" directories become logs of the same name, each
+    imported as a single entry holding the whole file. All other files are stored as files.
+
+    Parameters
+    ----------
+    source : str or Path
+        The directory of the `DiskMemory`, such as "proto-builder/memory" in a project.
+    target : SqliteMemory
+        The memory to copy into.
+
+    Returns
+    -------
+    int
+        The number of files copied.
+    """
+    source_memory = DiskMemory(source)
+    files = []
+    logs = []
+    for key in source_memory:
+        value = source_memory[key]
+        log_key = target._split_log_key(Path(key).as_posix())
+        if log_key:
+            created = datetime.fromtimestamp(
+                _modified_time(source_memory, key)
+            ).isoformat()
+            logs.append((*log_key, created, value))
+        else:
+            files.append((key, value))
+    with target._lock:
+        target.flush()
+        with target._connection:
+            target._connection.executemany(
+                "INSERT OR REPLACE INTO files (key, value) VALUES (?, ?)", files
+            )
+            target._connection.executemany(
+                "INSERT INTO logs (archive, key, created, value) VALUES (?, ?, ?, ?)",
+                logs,
+            )
+    return len(files) + len(logs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Migrate a DiskMemory directory into a SqliteMemory database."
+    )
+    parser.add_argument("source", help="the memory directory, e.g. proto-builder/memory")
+    parser.add_argument("database", help="the SQLite database file to create or extend")
+    args = parser.parse_args()
+
+    memory = SqliteMemory(args.database)
+    count = migrate_disk_memory(args.source, memory)
+    memory.close()
+    print(f"Migrated {count} files from {args.source} to {args.database}")
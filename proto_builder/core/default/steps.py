@@ -39,8 +39,14 @@ from langchain.schema import HumanMessage, SystemMessage
 
 from proto_builder.core.ai import AI
 from proto_builder.core.base_execution_env import BaseExecutionEnv
-from proto_builder.core.chat_to_files import apply_diffs, chat_to_files_dict, parse_diffs
+from proto_builder.core.chat_to_files import (
+    StreamingDiffValidator,
+    apply_diffs,
+    chat_to_files_dict,
+    parse_diffs,
+)
 from proto_builder.core.default.constants import MAX_EDIT_REFINEMENT_STEPS
+from proto_builder.core.diff import LinesView
 from proto_builder.core.default.paths import (
     CODE_GEN_LOG_FILE,
     ENTRYPOINT_FILE,
@@ -50,9 +56,9 @@ from proto_builder.core.default.paths import (
     DIFF_LOG_FILE,
 )   
 from proto_builder.core.files_dict import FilesDict
+from proto_builder.core.linting import Linting
 from proto_builder.core.preprompts_holder import PrepromptsHolder
 from proto_builder.core.prompt import Prompt
-from proto_builder.core.files_dict import FilesDict, file_to_lines_dict
 from proto_builder.core.base_memory import BaseMemory
 from termcolor import colored
 
@@ -138,9 +144,10 @@ def gen_code(
     FilesDict
         A dictionary of file names to their respective source code content.
     """
-    preprompts = preprompts_holder.get_preprompts()
     messages = ai.start(
-        setup_sys_prompt(preprompts), prompt.to_langchain_content(), step_name=curr_fn()
+        preprompts_holder.compose(setup_sys_prompt),
+        prompt.to_langchain_content(),
+        step_name=curr_fn(),
     )
     chat = messages[-1].content.strip()
     memory.log(CODE_GEN_LOG_FILE, "\n\n".join(x.pretty_repr() for x in messages))
@@ -280,10 +287,15 @@ def improve_fn(
     memory: BaseMemory,
     preprompts_holder: PrepromptsHolder,
     diff_timeout=3,
+    lint: bool = False,
 ) -> FilesDict:
     """
     Improves the code based on user input and returns the updated files.
 
+    The files sent to the model are recorded as the baseline snapshot of `files_dict`, so
+    the returned files report the edits of the model through `changed_files` and
+    `removed_files`, and only the edited files are linted.
+
     Parameters
     ----------
     ai : AI
@@ -296,15 +308,20 @@ def improve_fn(
         The memory interface where the code and related data are stored.
     preprompts_holder : PrepromptsHolder
         The holder for preprompt messages that guide the AI model.
+    lint : bool, optional
+        Whether to lint the files edited by the model. Default is False.
 
     Returns
     -------
     FilesDict
         The dictionary of file names to their respective updated source code content.
     """
-    preprompts = preprompts_holder.get_preprompts()
+    if isinstance(files_dict, FilesDict):
+        files_dict.snapshot()
     messages = [
-        SystemMessage(content=setup_sys_prompt_existing_code(preprompts)),
+        SystemMessage(
+            content=preprompts_holder.compose(setup_sys_prompt_existing_code)
+        ),
     ]
 
     # Add files as input
@@ -314,15 +331,46 @@ def improve_fn(
         DEBUG_LOG_FILE,
         "UPLOADED FILES:\n" + files_dict.to_log() + "\nPROMPT:\n" + prompt.text,
     )
-    return _improve_loop(ai, files_dict, memory, messages, diff_timeout=diff_timeout)
+    files_dict = _improve_loop(
+        ai, files_dict, memory, messages, diff_timeout=diff_timeout
+    )
+    if isinstance(files_dict, FilesDict):
+        changed, removed = files_dict.changed_files(), files_dict.removed_files()
+        memory.log(
+            DEBUG_LOG_FILE,
+            f"CHANGED FILES ({len(changed)} of {len(files_dict)}):\n"
+            + "\n".join(sorted(map(str, changed)))
+            + f"\nREMOVED FILES ({len(removed)}):\n"
+            + "\n".join(sorted(map(str, removed))),
+        )
+        if lint:
+            files_dict = Linting().lint_files(files_dict, changed_only=True)
+    return files_dict
+
+
+def _next_with_streamed_diffs(
+    ai: AI, files_dict: FilesDict, messages: List, step_name: str, diff_timeout=3
+) -> tuple[List, StreamingDiffValidator]:
+    """
+    Advances the conversation while validating each diff as soon as it has been streamed.
+    """
+    validator = StreamingDiffValidator(files_dict, diff_timeout=diff_timeout)
+    try:
+        with ai.stream_to(validator.feed):
+            messages = ai.next(messages, step_name=step_name)
+    finally:
+        validator.close()
+    return messages, validator
 
 
 def _improve_loop(
     ai: AI, files_dict: FilesDict, memory: BaseMemory, messages: List, diff_timeout=3
 ) -> FilesDict:
-    messages = ai.next(messages, step_name=curr_fn())
+    messages, validator = _next_with_streamed_diffs(
+        ai, files_dict, messages, curr_fn(), diff_timeout=diff_timeout
+    )
     files_dict, errors = salvage_correct_hunks(
-        messages, files_dict, memory, diff_timeout=diff_timeout
+        messages, files_dict, memory, diff_timeout=diff_timeout, validator=validator
     )
 
     retries = 0
@@ -334,9 +382,11 @@ def _improve_loop(
                 + "\n Only rewrite the problematic diffs, making sure that the failing ones are now on the correct format and can be found in the code. Make sure to not repeat past mistakes. \n"
             )
         )
-        messages = ai.next(messages, step_name=curr_fn())
+        messages, validator = _next_with_streamed_diffs(
+            ai, files_dict, messages, curr_fn(), diff_timeout=diff_timeout
+        )
         files_dict, errors = salvage_correct_hunks(
-            messages, files_dict, memory, diff_timeout
+            messages, files_dict, memory, diff_timeout, validator=validator
         )
         retries += 1
 
@@ -344,7 +394,11 @@ def _improve_loop(
 
 
 def salvage_correct_hunks(
-    messages: List, files_dict: FilesDict, memory: BaseMemory, diff_timeout=3
+    messages: List,
+    files_dict: FilesDict,
+    memory: BaseMemory,
+    diff_timeout=3,
+    validator: StreamingDiffValidator = None,
 ) -> tuple[FilesDict, List[str]]:
     error_messages = []
     ai_response = messages[-1].content.strip()
@@ -352,12 +406,17 @@ def salvage_correct_hunks(
     diffs = parse_diffs(ai_response, diff_timeout=diff_timeout)
     # validate and correct diffs
 
-    for _, diff in diffs.items():
+    for filename, diff in diffs.items():
         # if diff is a new file, validation and correction is unnecessary
         if not diff.is_new_file():
-            problems = diff.validate_and_correct(
-                file_to_lines_dict(files_dict[diff.filename_pre])
-            )
+            # reuse the validation done while the response was streaming, if any
+            streamed = validator.take(diff) if validator is not None else None
+            if streamed is not None:
+                diffs[filename], problems = streamed
+            else:
+                problems = diff.validate_and_correct(
+                    LinesView(files_dict[diff.filename_pre].split("\n"))
+                )
             error_messages.extend(problems)
     files_dict = apply_diffs(diffs, files_dict)
     memory.log(IMPROVE_LOG_FILE, "\n\n".join(x.pretty_repr() for x in messages))
@@ -13,10 +13,13 @@ Key Features:
 
 4. Utility functions `is_similar` and `count_ratio` offer the capability to compare strings for similarity, accounting for variations in spacing and case. This aids in the validation process by allowing a flexible comparison of code lines.
 
+5. The `LineIndex` class indexes the lines of a file once per diff, so that searching the file for lines similar to a hunk line only scores a shortlist of candidates instead of every line. The shortlist is scored at once by `CharCountMatrix`, which holds NumPy character-count vectors of the lines.
+
 Dependencies:
 
 - `logging`: Utilized for logging warnings and errors encountered during the validation and correction process.
 - `collections.Counter`: Used for counting occurrences of characters in strings, supporting the string similarity assessment functions.
+- `numpy`: Used for the vectorized character-count similarity kernel.
 
 Functions and Classes:
 
@@ -28,13 +31,23 @@ Functions and Classes:
 
 4. `count_ratio(str1, str2)`: Function that computes the ratio of common characters to the length of the longer string, aiding in the assessment of line similarity.
 
+5. `LinesView`: Class providing an array-backed, windowed, read-only mapping of line numbers to lines, used instead of dicts of lines during validation.
+
+6. `LineIndex`: Class indexing the lines of a file by normalized content and length for fast similarity lookups.
+
+7. `CharCountMatrix` and `count_ratios(line, lines)`: Vectorized versions of `count_ratio`, scoring one line against many lines in one NumPy operation.
+
 This module is essential for developers and teams utilizing version control systems, providing tools for a deeper analysis and correction of diffs, ensuring the integrity and accuracy of code changes.
 
 """
 import logging
 
-from collections import Counter
-from typing import List
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
 
 RETAIN = "retain"
 ADD = "add"
@@ -130,7 +143,48 @@ class Hunk:
         else:
             pass
 
-    def find_start_line(self, lines_dict: dict, problems: list) -> bool:
+    @staticmethod
+    def similar_lines(
+        line: str, lines_dict: dict, line_index: Optional["LineIndex"] = None
+    ) -> List[int]:
+        """
+        Returns the numbers of the lines in lines_dict similar to the given line, in ascending order.
+        Lines equal to it up to spaces and case are preferred: when there are any, only they are returned.
+        """
+        if line_index is None:
+            normalized = normalize_line(line)
+            exact = [
+                line_number
+                for line_number, line_content in lines_dict.items()
+                if normalize_line(line_content) == normalized
+            ]
+            if exact:
+                return exact
+            return [
+                line_number
+                for line_number, line_content in lines_dict.items()
+                if is_similar(line, line_content)
+            ]
+        # exact occurrences are looked up in constant time, lines are only scored on a miss
+        exact = [
+            line_number
+            for line_number in line_index.exact_lines(line)
+            if line_number in lines_dict
+        ]
+        if exact:
+            return exact
+        return [
+            line_number
+            for line_number in line_index.similar_lines(line)
+            if line_number in lines_dict
+        ]
+
+    def find_start_line(
+        self,
+        lines_dict: dict,
+        problems: list,
+        line_index: Optional["LineIndex"] = None,
+    ) -> bool:
         """Finds the starting line of the hunk in the original code and returns a boolean value accordingly. If the starting line is not found, it appends a problem message to the problems list."""
 
         # ToDo handle the case where the start line is 0 or 1 characters separately
@@ -140,11 +194,11 @@ class Hunk:
             # find the first line that is not an add
             for index, line in enumerate(self.lines):
                 if line[0] != ADD:
-                    for line_number, line_content in lines_dict.items():
-                        # if the line is similar to a non-blank line in line_dict, we can pick the line prior to it
-                        if is_similar(line[1], line_content) and line[1] != "":
-                            start_line = line_number - 1
-                            break
+                    # if the line is similar to a non-blank line in line_dict, we can pick the line prior to it
+                    if line[1] != "":
+                        matches = self.similar_lines(line[1], lines_dict, line_index)
+                        if matches:
+                            start_line = matches[0] - 1
                     # if the start line is not found, append a problem message
                     if start_line is None:
                         problems.append(
@@ -158,23 +212,23 @@ class Hunk:
                         retain_line = lines_dict.get(start_line, "")
                         if retain_line:
                             self.add_retained_line(lines_dict[start_line], 0)
-                            return self.validate_and_correct(lines_dict, problems)
+                            return self.validate_and_correct(
+                                lines_dict, problems, line_index
+                            )
                         else:
                             problems.append(
                                 f"In {self.hunk_to_string()}:The starting line of the diff {self.hunk_to_string()} does not exist in the code"
                             )
                             return False
-        pot_start_lines = {
-            key: is_similar(self.lines[0][1], line) for key, line in lines_dict.items()
-        }
-        sum_of_matches = sum(pot_start_lines.values())
+        pot_start_lines = self.similar_lines(self.lines[0][1], lines_dict, line_index)
+        sum_of_matches = len(pot_start_lines)
         if sum_of_matches == 0:
             # before we go any further, we should check if it's a comment from LLM
             if self.lines[0][1].count("#") > 0:
                 # if it is, we can mark it as an ADD lines
                 self.relabel_line(0, ADD)
                 # and restart the validation at the next line
-                return self.validate_and_correct(lines_dict, problems)
+                return self.validate_and_correct(lines_dict, problems, line_index)
 
             else:
                 problems.append(
@@ -182,15 +236,11 @@ class Hunk:
                 )
                 return False
         elif sum_of_matches == 1:
-            start_ind = list(pot_start_lines.keys())[
-                list(pot_start_lines.values()).index(True)
-            ]  # lines are one indexed
+            start_ind = pot_start_lines[0]  # lines are one indexed
         else:
             logging.warning("multiple candidates for starting index")
             # ToDo handle all the cases better again here. Smartest choice is that, for each candidate check match to the next line etc (recursively)
-            start_ind = list(pot_start_lines.keys())[
-                list(pot_start_lines.values()).index(True)
-            ]
+            start_ind = pot_start_lines[0]
         self.start_line_pre_edit = start_ind
 
         # This should now be fulfilled by default
@@ -201,9 +251,11 @@ class Hunk:
         """Validates the lines of the hunk against the original file and returns a boolean value accordingly. If the lines do not match, it appends a problem message to the problems list."""
         hunk_ind = 0
         file_ind = self.start_line_pre_edit
+        # lines_dict is not modified below, so the last line number is looked up once
+        last_line = last_line_number(lines_dict)
         # make an orig hunk lines for logging
         # orig_hunk_lines = deepcopy(self.lines)
-        while hunk_ind < len(self.lines) and file_ind <= max(lines_dict):
+        while hunk_ind < len(self.lines) and file_ind <= last_line:
             if self.lines[hunk_ind][0] == ADD:
                 # this cannot be validated, jump one index
                 hunk_ind += 1
@@ -221,7 +273,7 @@ class Hunk:
                             file_ind,
                             min(
                                 file_ind + self.forward_block_len,
-                                max(lines_dict.keys()),
+                                last_line,
                             ),
                         )
                     ]
@@ -289,17 +341,19 @@ class Hunk:
         self,
         lines_dict: dict,
         problems: list,
+        line_index: Optional["LineIndex"] = None,
     ) -> bool:
         """
         Validates and corrects the hunk based on the original lines.
 
         This function attempts to validate the hunk by comparing its lines to the original file and making corrections
         where necessary. It also identifies problems such as non-matching lines or incorrect line types.
+        An optional LineIndex over the original file speeds up the search for the starting line.
         """
         start_true = self.check_start_line(lines_dict)
 
         if not start_true:
-            if not self.find_start_line(lines_dict, problems):
+            if not self.find_start_line(lines_dict, problems, line_index):
                 return False
 
         # Now we should be able to validate the hunk line by line and add missing line
@@ -337,11 +391,15 @@ class Diff:
             string += hunk.hunk_to_string()
         return string.strip()
 
-    def validate_and_correct(self, lines_dict: dict) -> List[str]:
-        """Validates and corrects each hunk in the diff."""
+    def validate_and_correct(self, lines_dict: Union[dict, "LinesView"]) -> List[str]:
+        """Validates and corrects each hunk in the diff. Lines are numbered contiguously from 1, either in a dict or a LinesView."""
         problems = []
         past_hunk = None
-        cut_lines_dict = lines_dict.copy()
+        if not isinstance(lines_dict, LinesView):
+            lines_dict = LinesView.from_dict(lines_dict)
+        # narrowing the view to the lines after the previous hunk does not copy any line
+        cut_lines_dict = lines_dict
+        line_index = LineIndex(lines_dict)
         for hunk in self.hunks:
             if past_hunk is not None:
                 # make sure to not cut so much that the start_line gets out of range
@@ -349,10 +407,8 @@ class Diff:
                     past_hunk.start_line_pre_edit + past_hunk.hunk_len_pre_edit,
                     hunk.start_line_pre_edit,
                 )
-                cut_lines_dict = {
-                    key: val for key, val in cut_lines_dict.items() if key >= (cut_ind)
-                }
-            is_valid = hunk.validate_and_correct(cut_lines_dict, problems)
+                cut_lines_dict = cut_lines_dict.cut(cut_ind)
+            is_valid = hunk.validate_and_correct(cut_lines_dict, problems, line_index)
             if not is_valid and len(problems) > 0:
                 for idx, val in enumerate(problems):
                     print(f"\nInvalid Hunk NO.{idx}---\n{val}\n---")
@@ -378,6 +434,205 @@ class Diff:
         return problems
 
 
+class LinesView(Mapping):
+    """
+    A read-only mapping from line number to line content over a window of a list of lines.
+
+    This replaces the dict of lines during diff validation: all views of a file share one list,
+    cutting away the lines before a given line number creates a new view in O(1), and the last
+    line number is known without scanning the keys.
+
+    Attributes:
+        first_line (int): The first line number in the window.
+        last_line (int): The last line number of the underlying lines.
+    """
+
+    def __init__(self, lines: List[str], first_line: int = 1, offset: int = 1) -> None:
+        # offset is the line number of lines[0]
+        self._lines = lines
+        self._offset = offset
+        self.first_line = max(first_line, offset)
+        self.last_line = offset + len(lines) - 1
+
+    @classmethod
+    def from_dict(cls, lines_dict: dict) -> "LinesView":
+        """Creates a view from a dict of lines with contiguous line numbers."""
+        if not lines_dict:
+            return cls([])
+        first_line = min(lines_dict)
+        return cls(
+            [lines_dict[key] for key in range(first_line, max(lines_dict) + 1)],
+            offset=first_line,
+        )
+
+    def cut(self, first_line: int) -> "LinesView":
+        """Returns a view without the lines numbered below first_line."""
+        return LinesView(self._lines, max(self.first_line, first_line), self._offset)
+
+    def __getitem__(self, line_number: int) -> str:
+        if (
+            not isinstance(line_number, int)
+            or not self.first_line <= line_number <= self.last_line
+        ):
+            raise KeyError(line_number)
+        return self._lines[line_number - self._offset]
+
+    def __contains__(self, line_number) -> bool:
+        return (
+            isinstance(line_number, int)
+            and self.first_line <= line_number <= self.last_line
+        )
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.first_line, self.last_line + 1))
+
+    def __len__(self) -> int:
+        return max(0, self.last_line - self.first_line + 1)
+
+
+def last_line_number(lines_dict: Union[dict, LinesView]) -> int:
+    """Returns the last line number of a dict of lines or a LinesView, or 0 if there are no lines."""
+    if isinstance(lines_dict, LinesView):
+        return lines_dict.last_line if lines_dict else 0
+    return max(lines_dict, default=0)
+
+
+class LineIndex:
+    """
+    Indexes the lines of a file for fast lookups of lines similar to a given line.
+
+    Lines are normalized the same way `count_ratio` does (spaces removed, lowercased). Exact
+    matches are found through a map from normalized line to line numbers. Since two lines can
+    only reach the similarity threshold if their normalized lengths are within that ratio of
+    each other, the lines are also kept sorted by normalized length, and fuzzy candidates form a
+    contiguous window found by bisection. The window is scored in one vectorized operation on a
+    CharCountMatrix. Fuzzy lookups return exactly the lines for which `is_similar` holds, and
+    are memoized.
+
+    Attributes:
+        similarity_threshold (float): The threshold passed to `is_similar`.
+    """
+
+    def __init__(self, lines_dict: dict, similarity_threshold=0.9) -> None:
+        self.similarity_threshold = similarity_threshold
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        for line_number, line_content in lines_dict.items():
+            self._exact[normalize_line(line_content)].append(line_number)
+        by_length = sorted(
+            (len(normalized), line_number, normalized)
+            for line_number, normalized in (
+                (line_number, normalize_line(line_content))
+                for line_number, line_content in lines_dict.items()
+            )
+        )
+        self._lengths = [length for length, _, _ in by_length]
+        self._line_numbers_by_length = [line_number for _, line_number, _ in by_length]
+        self._matrix = CharCountMatrix([normalized for _, _, normalized in by_length])
+        self._lookups: Dict[str, List[int]] = {}
+
+    def exact_lines(self, line: str) -> List[int]:
+        """Returns the numbers of the indexed lines equal to the given line up to spaces and case, in ascending order."""
+        return self._exact.get(normalize_line(line), [])
+
+    def similar_lines(self, line: str) -> List[int]:
+        """Returns the numbers of the indexed lines similar to the given line, in ascending order."""
+        normalized = normalize_line(line)
+        if normalized in self._lookups:
+            return self._lookups[normalized]
+
+        threshold = self.similarity_threshold
+        length = len(normalized)
+        # small tolerance so that floating point rounding never drops a candidate
+        low = bisect_left(self._lengths, length * threshold - 1e-9)
+        high = (
+            bisect_right(self._lengths, length / threshold + 1e-9)
+            if threshold > 0
+            else len(self._lengths)
+        )
+        matches = []
+        if low < high:
+            ratios = self._matrix.ratios(normalized, low, high)
+            matches = sorted(
+                self._line_numbers_by_length[low + offset]
+                for offset in np.flatnonzero(ratios >= threshold)
+            )
+        self._lookups[normalized] = matches
+        return matches
+
+
+class CharCountMatrix:
+    """
+    Character-count vectors of a list of lines, used to score one line against many at once.
+
+    Every normalized line becomes a row of counts over the characters occurring in the lines,
+    stored as uint16 (uint32 for lines longer than 65535 characters). `ratios` computes the
+    ratio `count_ratio` would give for every row with a single vectorized minimum and sum,
+    returning identical values.
+    """
+
+    def __init__(self, lines: List[str]) -> None:
+        normalized = [normalize_line(line) for line in lines]
+        self.vocabulary = {
+            char: column for column, char in enumerate(sorted(set().union(*normalized)))
+        }
+        self.lengths = np.fromiter(
+            (len(line) for line in normalized), dtype=np.int64, count=len(normalized)
+        )
+        max_length = int(self.lengths.max()) if len(normalized) else 0
+        dtype = np.uint16 if max_length <= np.iinfo(np.uint16).max else np.uint32
+        n_columns = max(len(self.vocabulary), 1)
+        columns = np.fromiter(
+            (self.vocabulary[char] for line in normalized for char in line),
+            dtype=np.int64,
+            count=int(self.lengths.sum()),
+        )
+        rows = np.repeat(np.arange(len(normalized), dtype=np.int64), self.lengths)
+        self.counts = (
+            np.bincount(
+                rows * n_columns + columns, minlength=len(normalized) * n_columns
+            )
+            .reshape(len(normalized), n_columns)
+            .astype(dtype)
+        )
+
+    def ratios(self, line: str, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Returns the `count_ratio` of the given line against rows start to stop."""
+        normalized = normalize_line(line)
+        max_count = np.iinfo(self.counts.dtype).max
+        query = np.zeros(self.counts.shape[1], dtype=self.counts.dtype)
+        for char, count in Counter(normalized).items():
+            column = self.vocabulary.get(char)
+            # characters absent from every row cannot contribute to an intersection
+            if column is not None:
+                query[column] = min(count, max_count)
+        intersection = np.minimum(self.counts[start:stop], query).sum(
+            axis=1, dtype=np.int64
+        )
+        longer_length = np.maximum(self.lengths[start:stop], len(normalized))
+        return np.where(
+            longer_length == 0, 1.0, intersection / np.maximum(longer_length, 1)
+        )
+
+
+def count_ratios(line: str, lines: List[str]) -> np.ndarray:
+    """
+    Computes `count_ratio` of one line against every line of a list in one vectorized operation.
+
+    Parameters:
+    - line (str): The line to compare.
+    - lines (List[str]): The lines to compare it against.
+
+    Returns:
+    - np.ndarray: The ratio for every line, identical to calling `count_ratio` on each pair.
+    """
+    return CharCountMatrix(lines).ratios(line)
+
+
+def normalize_line(line: str) -> str:
+    """Normalizes a line for similarity comparisons by removing spaces and lowercasing it."""
+    return line.replace(" ", "").lower()
+
+
 def is_similar(str1, str2, similarity_threshold=0.9) -> bool:
     """
     Compares two strings for similarity, ignoring spaces and case.
@@ -408,7 +663,7 @@ def count_ratio(str1, str2) -> float:
     Returns:
     - float: The ratio of common characters to the length of the longer string.
     """
-    str1, str2 = str1.replace(" ", "").lower(), str2.replace(" ", "").lower()
+    str1, str2 = normalize_line(str1), normalize_line(str2)
 
     counter1, counter2 = Counter(str1), Counter(str2)
     intersection = sum((counter1 & counter2).values())
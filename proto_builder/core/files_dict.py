@@ -8,10 +8,56 @@ with an AI agent and to enforce type checks on keys and values.
 
 Classes:
     FilesDict: A dictionary-based container for managing code files.
+    PieceTableFilesDict: A mapping-based container storing code files as piece tables, for large codebases.
+    LazyFilesDict: A FilesDict reading code files on first access, for large trees.
 """
+import hashlib
+import threading
+
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Union
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Set,
+    Union,
+)
+
+from proto_builder.core.piece_table import PieceTable
+
+# Rendered chat fragments, keyed by file name and content hash, shared by all FilesDict instances.
+# The cache is bounded by the total number of characters of the fragments.
+CHAT_FRAGMENT_CACHE_MAX_CHARS = 64 * 1024 * 1024
+_chat_fragments: "OrderedDict[tuple, str]" = OrderedDict()
+_chat_fragments_chars = 0
+_chat_fragments_lock = threading.Lock()
+# How often a rendered fragment could be reused instead of rendering the file again
+CHAT_FRAGMENT_STATS = {"hits": 0, "misses": 0}
+
+
+def content_digest(content: str) -> str:
+    """
+    Computes the digest identifying a file content.
+
+    Parameters
+    ----------
+    content : str
+        The content of the file.
+
+    Returns
+    -------
+    str
+        A hex digest of the content.
+    """
+    # lone surrogates, which model output may contain, are hashed rather than rejected
+    data = content.encode("utf-8", errors="surrogatepass")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
 
 
 # class Code(MutableMapping[str | Path, str]):
@@ -24,6 +70,11 @@ class FilesDict(dict):
     representing filenames and their corresponding code content. It provides methods
     to format its contents for chat-based interaction with an AI agent and to enforce
     type checks on keys and values.
+
+    It also tracks changes: the digest of every file is computed lazily and cached until the
+    file is replaced, and `snapshot` records a baseline against which `changed_files` and
+    `removed_files` report what was modified. Copies keep the cached digests and the
+    baseline, so downstream stages can skip files that did not change.
     """
 
     def __setitem__(self, key: Union[str, Path], value: str):
@@ -52,24 +103,121 @@ class FilesDict(dict):
             raise TypeError("Values must be strings")
         super().__setitem__(key, value)
 
+    def copy(self) -> "FilesDict":
+        """
+        Create a shallow copy that keeps the cached digests and the baseline snapshot.
+
+        Returns
+        -------
+        FilesDict
+            The copy.
+        """
+        files = FilesDict(self)
+        files._digests = dict(self._digest_cache())
+        files._baseline = getattr(self, "_baseline", None)
+        return files
+
+    def _digest_cache(self) -> dict:
+        # Construction and dict.update bypass __setitem__, so the cache is created lazily and
+        # each entry keeps the content object its digest was computed from.
+        digests = getattr(self, "_digests", None)
+        if digests is None:
+            digests = self._digests = {}
+        return digests
+
+    def content_digest(self, key: Union[str, Path]) -> str:
+        """
+        Get the digest of a file's content, computing it only if the content changed.
+
+        Parameters
+        ----------
+        key : Union[str, Path]
+            The filename.
+
+        Returns
+        -------
+        str
+            A hex digest of the content.
+        """
+        content = self[key]
+        digests = self._digest_cache()
+        cached = digests.get(key)
+        if cached is not None and cached[0] is content:
+            return cached[1]
+        digest = content_digest(content)
+        digests[key] = (content, digest)
+        return digest
+
+    def snapshot(self) -> Dict[Union[str, Path], str]:
+        """
+        Record the current content digests as the baseline for change tracking.
+
+        Returns
+        -------
+        Dict[Union[str, Path], str]
+            The digest of every file, keyed by filename.
+        """
+        self._baseline = {key: self.content_digest(key) for key in self}
+        return dict(self._baseline)
+
+    def has_baseline(self) -> bool:
+        """Check whether a baseline snapshot was recorded."""
+        return getattr(self, "_baseline", None) is not None
+
+    def changed_files(self) -> Set[Union[str, Path]]:
+        """
+        Get the files added or modified since the baseline snapshot.
+
+        Files whose content object was not replaced since their digest was cached are not
+        hashed again, so this only hashes the files that were assigned.
+
+        Returns
+        -------
+        Set[Union[str, Path]]
+            The changed filenames; all filenames if no snapshot was taken.
+        """
+        baseline: Optional[dict] = getattr(self, "_baseline", None)
+        if baseline is None:
+            return set(self)
+        return {key for key in self if baseline.get(key) != self.content_digest(key)}
+
+    def removed_files(self) -> Set[Union[str, Path]]:
+        """
+        Get the files present in the baseline snapshot but not anymore.
+
+        Returns
+        -------
+        Set[Union[str, Path]]
+            The removed filenames.
+        """
+        baseline: Optional[dict] = getattr(self, "_baseline", None)
+        if baseline is None:
+            return set()
+        return {key for key in baseline if key not in self}
+
     def to_chat(self):
         """
         Formats the items of the object (assuming file name and content pairs)
         into a string suitable for chat display.
 
+        Each file is rendered into a line-numbered fragment that is memoized by content hash,
+        so files left unchanged between improve iterations are not rendered again. The hash of
+        a FilesDict file is the digest it caches, so unchanged files are not hashed again either.
+
         Returns
         -------
         str
             A string representation of the files.
         """
-        chat_str = ""
-        for file_name, file_content in self.items():
-            lines_dict = file_to_lines_dict(file_content)
-            chat_str += f"File: {file_name}\n"
-            for line_number, line_content in lines_dict.items():
-                chat_str += f"{line_number} {line_content}\n"
-            chat_str += "\n"
-        return f"```\n{chat_str}```"
+        fragments = [
+            chat_fragment(
+                file_name,
+                file_content,
+                self.content_digest(file_name) if isinstance(self, FilesDict) else None,
+            )
+            for file_name, file_content in self.items()
+        ]
+        return "".join(["```\n", *fragments, "```"])
 
     def to_log(self):
         """
@@ -89,6 +237,303 @@ class FilesDict(dict):
         return log_str
 
 
+class PieceTableFilesDict(MutableMapping):
+    """
+    A mapping-based container storing code files as immutable piece tables.
+
+    It exposes the same interface as FilesDict: keys are filenames, values read as strings, and
+    `to_chat` / `to_log` are available. Copies share the piece tables of all files, and
+    `apply_diffs` stores each edited file as a new version that shares every unedited piece
+    with the previous one, so large generated codebases are not copied on every edit.
+    """
+
+    def __init__(self, files=None):
+        self._tables = {}
+        if files is not None:
+            self.update(files)
+
+    def __setitem__(self, key: Union[str, Path], value: Union[str, PieceTable]):
+        """
+        Set the code content for the given filename, enforcing type checks on the key and value.
+
+        Parameters
+        ----------
+        key : Union[str, Path]
+            The filename as a key for the code content.
+        value : Union[str, PieceTable]
+            The code content to associate with the filename.
+
+        Raises
+        ------
+        TypeError
+            If the key is not a string or Path, or if the value is not a string or PieceTable.
+        """
+        if not isinstance(key, (str, Path)):
+            raise TypeError("Keys must be strings or Path's")
+        if isinstance(value, str):
+            value = PieceTable.from_text(value)
+        elif not isinstance(value, PieceTable):
+            raise TypeError("Values must be strings or PieceTables")
+        self._tables[key] = value
+
+    def __getitem__(self, key: Union[str, Path]) -> str:
+        return self._tables[key].text
+
+    def __delitem__(self, key: Union[str, Path]) -> None:
+        del self._tables[key]
+
+    def __iter__(self) -> Iterator[Union[str, Path]]:
+        return iter(self._tables)
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def __repr__(self) -> str:
+        return f"PieceTableFilesDict({list(self._tables)!r})"
+
+    def table(self, key: Union[str, Path]) -> PieceTable:
+        """
+        Get the piece table holding the content of a file.
+
+        Parameters
+        ----------
+        key : Union[str, Path]
+            The filename.
+
+        Returns
+        -------
+        PieceTable
+            The current version of the file.
+        """
+        return self._tables[key]
+
+    def copy(self) -> "PieceTableFilesDict":
+        """
+        Create a copy sharing the piece tables of all files.
+
+        Returns
+        -------
+        PieceTableFilesDict
+            The copy.
+        """
+        files = PieceTableFilesDict()
+        files._tables = dict(self._tables)
+        return files
+
+    to_chat = FilesDict.to_chat
+    to_log = FilesDict.to_log
+
+
+class _Loader:
+    """A pending value of a LazyFilesDict."""
+
+    __slots__ = ("load",)
+
+    def __init__(self, load: Callable[[], str]):
+        self.load = load
+
+
+class LazyFilesDict(FilesDict):
+    """
+    A FilesDict whose contents are read on first access.
+
+    Each file is given as a loader, which is called the first time the file is read; `load`
+    reads many files at once on a thread pool. Files that are never read, such as build output
+    a step does not look at, are never loaded into memory. Pending files are stored as loaders
+    in the underlying dict, so every read goes through `__getitem__`, including `items`,
+    `values`, `get` and comparisons.
+    """
+
+    def __init__(
+        self,
+        loaders: Optional[Dict[Union[str, Path], Callable[[], str]]] = None,
+        max_workers: Optional[int] = None,
+    ):
+        super().__init__()
+        for key, load in (loaders or {}).items():
+            dict.__setitem__(self, key, _Loader(load))
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: Union[str, Path]) -> str:
+        value = super().__getitem__(key)
+        if isinstance(value, _Loader):
+            loaded = value.load()
+            with self._lock:
+                # another thread may have loaded or replaced the value meanwhile
+                value = dict.get(self, key)
+                if isinstance(value, _Loader):
+                    dict.__setitem__(self, key, loaded)
+                    value = loaded
+            return loaded if value is None else value
+        return value
+
+    def __iter__(self) -> Iterator[Union[str, Path]]:
+        # overridden so that dict(files) and dict.update read the values through __getitem__
+        # instead of copying the loaders
+        return super().__iter__()
+
+    get = Mapping.get
+    items = Mapping.items
+    values = Mapping.values
+    pop = MutableMapping.pop
+    popitem = MutableMapping.popitem
+    setdefault = MutableMapping.setdefault
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __repr__(self) -> str:
+        return f"LazyFilesDict({list(self)!r})"
+
+    def is_loaded(self, key: Union[str, Path]) -> bool:
+        """
+        Check whether the content of a file was read already.
+
+        Parameters
+        ----------
+        key : Union[str, Path]
+            The filename.
+
+        Returns
+        -------
+        bool
+            True if the content is in memory.
+        """
+        return not isinstance(super().__getitem__(key), _Loader)
+
+    def load(self, keys: Optional[Iterable[Union[str, Path]]] = None) -> "LazyFilesDict":
+        """
+        Read the content of many files in parallel on a thread pool.
+
+        Parameters
+        ----------
+        keys : Iterable[Union[str, Path]], optional
+            The filenames to read, by default all files not read yet.
+
+        Returns
+        -------
+        LazyFilesDict
+            This container, for chaining.
+        """
+        keys = [
+            key
+            for key in (dict.keys(self) if keys is None else keys)
+            if not self.is_loaded(key)
+        ]
+        if len(keys) > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # each read stores its result through __getitem__
+                list(executor.map(self.__getitem__, keys))
+        elif keys:
+            self[keys[0]]
+        return self
+
+    def copy(self) -> "LazyFilesDict":
+        """
+        Create a copy sharing the loaded contents and the pending loaders, keeping the cached
+        digests and the baseline snapshot.
+
+        Returns
+        -------
+        LazyFilesDict
+            The copy.
+        """
+        files = LazyFilesDict(max_workers=self.max_workers)
+        dict.update(files, dict.items(self))
+        files._digests = dict(self._digest_cache())
+        files._baseline = getattr(self, "_baseline", None)
+        return files
+
+    def to_files_dict(self) -> FilesDict:
+        """
+        Read every file and return the contents as a FilesDict.
+
+        Returns
+        -------
+        FilesDict
+            The contents of all files, with the digests cached so far and the baseline.
+        """
+        self.load()
+        files = FilesDict(self)
+        files._digests = dict(self._digest_cache())
+        files._baseline = getattr(self, "_baseline", None)
+        return files
+
+    def to_chat(self):
+        """Read the files not loaded yet in parallel, then format them as `FilesDict.to_chat`."""
+        self.load()
+        return super().to_chat()
+
+    def to_log(self):
+        """Read the files not loaded yet in parallel, then format them as `FilesDict.to_log`."""
+        self.load()
+        return super().to_log()
+
+
+def chat_fragment(
+    file_name: Union[str, Path], file_content: str, digest: Optional[str] = None
+) -> str:
+    """
+    Renders a file as a line-numbered fragment of `FilesDict.to_chat`, using a
+    process-wide cache keyed by file name and content hash.
+
+    Parameters
+    ----------
+    file_name : Union[str, Path]
+        The name of the file.
+    file_content : str
+        The content of the file.
+    digest : str, optional
+        The `content_digest` of the content if already known, computed otherwise.
+
+    Returns
+    -------
+    str
+        The file name header followed by the numbered lines of the file.
+    """
+    global _chat_fragments_chars
+
+    if digest is None:
+        digest = content_digest(file_content)
+    key = (str(file_name), digest)
+    with _chat_fragments_lock:
+        fragment = _chat_fragments.get(key)
+        if fragment is not None:
+            _chat_fragments.move_to_end(key)
+            CHAT_FRAGMENT_STATS["hits"] += 1
+            return fragment
+        CHAT_FRAGMENT_STATS["misses"] += 1
+
+    fragment = "".join(
+        [
+            f"File: {file_name}\n",
+            *[
+                f"{line_number} {line_content}\n"
+                for line_number, line_content in enumerate(
+                    file_content.split("\n"), 1
+                )
+            ],
+            "\n",
+        ]
+    )
+    if len(fragment) <= CHAT_FRAGMENT_CACHE_MAX_CHARS:
+        with _chat_fragments_lock:
+            if key not in _chat_fragments:
+                _chat_fragments[key] = fragment
+                _chat_fragments_chars += len(fragment)
+            while _chat_fragments_chars > CHAT_FRAGMENT_CACHE_MAX_CHARS:
+                _, evicted = _chat_fragments.popitem(last=False)
+                _chat_fragments_chars -= len(evicted)
+    return fragment
+
+
 def file_to_lines_dict(file_content: str) -> dict:
     """
     Converts file content into a dictionary where each line number is a key
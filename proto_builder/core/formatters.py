@@ -0,0 +1,413 @@
+"""
+External Formatters Module
+
+This module provides formatters for the languages that are not formatted in process, run as
+external programs. Formatter startup (a JVM, a Node.js runtime loading its plugins) usually costs
+far more than formatting a file, so files are always handed over in batches:
+
+- `WorkerFormatter` keeps one long-lived process per formatter, fed requests over stdin and
+  answering on stdout with one JSON document per line;
+- `BatchFormatter` runs the formatter once per batch, on copies of the files written to a
+  temporary directory, for formatters that rewrite files in place.
+
+A formatter whose program is missing or fails to start is disabled for the rest of the process,
+leaving the files of its languages unchanged. External formatters rewrite files of the project, so
+`Linting` only uses them when they are passed to it explicitly, e.g. `Linting(formatters=FORMATTERS)`.
+
+Classes:
+    ExternalFormatter: Base class of the formatters run as external programs.
+    WorkerFormatter: A formatter served by a long-lived worker process.
+    BatchFormatter: A formatter run once per batch of files, rewriting them in place.
+
+Functions:
+    default_formatters: Create the formatters registered by default, by file extension.
+
+Attributes:
+    FORMATTERS: The default formatters by file extension, shared by the `Linting` instances using them.
+"""
+
+import atexit
+import json
+import logging
+import os
+import selectors
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of seconds spent formatting one batch of files, or starting a worker
+FORMAT_TIMEOUT = 60
+# Maximum number of bytes read from a worker's stdout at once
+READ_CHUNK_SIZE = 64 * 1024
+
+# Node.js worker loading prettier once, then formatting one JSON request per line of stdin.
+# The first line written is a handshake telling whether prettier could be loaded.
+PRETTIER_WORKER_SCRIPT = """
+const readline = require("readline");
+let prettier = null;
+try {
+  prettier = require("prettier");
+  process.stdout.write(JSON.stringify({ready: true, version: prettier.version}) + "\\n");
+} catch (error) {
+  process.stdout.write(JSON.stringify({ready: false, error: String(error.message)}) + "\\n");
+}
+let chain = Promise.resolve();
+readline.createInterface({input: process.stdin}).on("line", (line) => {
+  chain = chain.then(async () => {
+    let response;
+    try {
+      const request = JSON.parse(line);
+      response = {content: await prettier.format(request.content, {filepath: request.path})};
+    } catch (error) {
+      response = {error: String(error.message || error)};
+    }
+    process.stdout.write(JSON.stringify(response) + "\\n");
+  });
+});
+"""
+
+
+class ExternalFormatter:
+    """
+    Base class of the formatters run as external programs.
+
+    Attributes
+    ----------
+    name : str
+        The name of the formatter, used in messages and in lint cache keys.
+    extensions : Tuple[str, ...]
+        The lower-case file extensions the formatter handles.
+    command : List[str]
+        The command running the formatter.
+    timeout : float
+        The maximum number of seconds spent formatting one batch.
+    version_command : List[str], optional
+        The command printing the version of the formatter.
+    disabled : bool
+        Whether the formatter was found unusable, in which case files are left unchanged.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        extensions: Sequence[str],
+        command: Sequence[str],
+        timeout: float = FORMAT_TIMEOUT,
+        version_command: Optional[Sequence[str]] = None,
+    ):
+        self.name = name
+        self.extensions = tuple(extensions)
+        self.command = list(command)
+        self.timeout = timeout
+        self.version_command = None if version_command is None else list(version_command)
+        self.disabled = False
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._version_resolved = False
+
+    @property
+    def version(self) -> Optional[str]:
+        """The version of the formatter, resolved once, or None if it is unknown."""
+        with self._lock:
+            if not self._version_resolved:
+                self._version = self._resolve_version() if self.available() else None
+                self._version_resolved = True
+            return self._version
+
+    def _resolve_version(self) -> Optional[str]:
+        if self.version_command is None:
+            return None
+        try:
+            completed = subprocess.run(
+                self.version_command,
+                stdin=subprocess.DEVNULL,
+                capture_output=True,
+                text=True,
+                timeout=self.timeout,
+            )
+        except (OSError, subprocess.SubprocessError) as error:
+            logger.debug(f"Could not get the version of {self.name}: {error}")
+            return None
+        # some formatters print their version on stderr
+        output = completed.stdout.strip() or completed.stderr.strip()
+        if completed.returncode != 0 or not output:
+            return None
+        return output.splitlines()[0]
+
+    @property
+    def cache_key(self) -> Optional[str]:
+        """
+        Identify the formatter, its version and its configuration in lint cache keys.
+
+        None when the version is unknown, in which case the results are not cached, as they
+        could outlive an upgrade of the formatter.
+        """
+        version = self.version
+        if version is None:
+            return None
+        return "\0".join([self.name, version] + self.command)
+
+    def available(self) -> bool:
+        """Check that the formatter can be used, disabling it otherwise."""
+        if not self.disabled and shutil.which(self.command[0]) is None:
+            self.disable(f"{self.command[0]} not found")
+        return not self.disabled
+
+    def disable(self, reason: str) -> None:
+        logger.warning(f"{self.name} disabled, leaving files unformatted: {reason}")
+        self.disabled = True
+        self.close()
+
+    def format_batch(
+        self, files: Sequence[Tuple[str, str]]
+    ) -> List[Tuple[str, Optional[str]]]:
+        """
+        Format a batch of files, never raising.
+
+        Parameters
+        ----------
+        files : Sequence[Tuple[str, str]]
+            The names and contents of the files.
+
+        Returns
+        -------
+        List[Tuple[str, Optional[str]]]
+            For each file, its formatted content, or its original content and the error
+            message when it could not be formatted.
+        """
+        if not files:
+            return []
+        with self._lock:
+            if not self.available():
+                return [(content, f"{self.name} disabled") for _, content in files]
+            try:
+                return self._format_batch(files)
+            except (OSError, ValueError, subprocess.SubprocessError) as error:
+                self.close()
+                return [(content, str(error)) for _, content in files]
+
+    def _format_batch(
+        self, files: Sequence[Tuple[str, str]]
+    ) -> List[Tuple[str, Optional[str]]]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release the resources held by the formatter."""
+
+
+class WorkerFormatter(ExternalFormatter):
+    """
+    A formatter served by a long-lived worker process.
+
+    The worker writes a handshake line `{"ready": true, "version": ...}` when started, then
+    answers every request line `{"path": ..., "content": ...}` of its stdin, in order, with a line
+    `{"content": ...}` or `{"error": ...}` on its stdout. The worker is started on the first
+    batch and restarted after a failure.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._process: Optional[subprocess.Popen] = None
+        self._worker_version: Optional[str] = None
+        # bytes read from the worker's stdout past the last complete response
+        self._buffer = bytearray()
+
+    def _start(self) -> subprocess.Popen:
+        if self._process is not None and self._process.poll() is None:
+            return self._process
+        process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._process = process
+        self._buffer = bytearray()
+        try:
+            handshake = self._read_response(process, time.monotonic() + self.timeout)
+        except (OSError, ValueError, subprocess.SubprocessError) as error:
+            # a worker failing to start is disabled, as the next start would fail alike
+            self.disable(str(error))
+            return process
+        if not handshake.get("ready"):
+            self.disable(handshake.get("error", "worker did not start"))
+        self._worker_version = handshake.get("version")
+        return process
+
+    def _resolve_version(self) -> Optional[str]:
+        if self.version_command is not None:
+            return super()._resolve_version()
+        # reported by the worker's handshake
+        try:
+            self._start()
+        except (OSError, ValueError, subprocess.SubprocessError) as error:
+            self.disable(str(error))
+        return None if self.disabled else self._worker_version
+
+    def _read_response(self, process: subprocess.Popen, deadline: float) -> dict:
+        if os.name == "posix":
+            line = self._read_line(process, deadline)
+        else:
+            # selectors do not support pipes on Windows, the worker is killed at the deadline
+            timer = threading.Timer(max(deadline - time.monotonic(), 0), process.kill)
+            timer.start()
+            try:
+                line = process.stdout.readline()
+            finally:
+                timer.cancel()
+        if not line:
+            raise OSError(f"{self.name} worker exited with code {process.poll()}")
+        return json.loads(line)
+
+    def _read_line(self, process: subprocess.Popen, deadline: float) -> bytes:
+        scanned = 0
+        with selectors.DefaultSelector() as selector:
+            selector.register(process.stdout, selectors.EVENT_READ)
+            while (end := self._buffer.find(b"\n", scanned)) < 0:
+                scanned = len(self._buffer)
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    # a worker stuck on a file is killed, failing the rest of the batch
+                    process.kill()
+                    raise subprocess.TimeoutExpired(self.name, self.timeout)
+                if not selector.select(wait):
+                    continue
+                data = os.read(process.stdout.fileno(), READ_CHUNK_SIZE)
+                if not data:
+                    return b""
+                self._buffer += data
+        line = bytes(self._buffer[: end + 1])
+        del self._buffer[: end + 1]
+        return line
+
+    def _format_batch(
+        self, files: Sequence[Tuple[str, str]]
+    ) -> List[Tuple[str, Optional[str]]]:
+        process = self._start()
+        if self.disabled:
+            return [(content, f"{self.name} disabled") for _, content in files]
+        deadline = time.monotonic() + self.timeout
+
+        def write_requests():
+            # written from a thread, so that a full stdout pipe cannot block the worker
+            try:
+                for name, content in files:
+                    request = json.dumps({"path": name, "content": content}) + "\n"
+                    process.stdin.write(request.encode("utf-8"))
+                process.stdin.flush()
+            except OSError:
+                pass  # the worker exited, reported when reading its responses
+
+        writer = threading.Thread(target=write_requests, daemon=True)
+        writer.start()
+        try:
+            results = []
+            for _, content in files:
+                response = self._read_response(process, deadline)
+                if "error" in response:
+                    results.append((content, response["error"]))
+                else:
+                    results.append((response["content"], None))
+            return results
+        finally:
+            writer.join()
+
+    def close(self) -> None:
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+
+
+class BatchFormatter(ExternalFormatter):
+    """
+    A formatter run once per batch of files, rewriting them in place.
+
+    The files are copied to a temporary directory, keeping their names so that the formatter
+    can pick its language and configuration, and the formatter is run with their paths
+    appended to `command`.
+    """
+
+    def _format_batch(
+        self, files: Sequence[Tuple[str, str]]
+    ) -> List[Tuple[str, Optional[str]]]:
+        with tempfile.TemporaryDirectory(prefix="proto-builder-format-") as directory:
+            paths = []
+            for index, (name, content) in enumerate(files):
+                # one subdirectory per file, as two files of the batch may share a name
+                path = Path(directory) / str(index) / Path(name).name
+                path.parent.mkdir()
+                path.write_text(content, encoding="utf-8")
+                paths.append(path)
+            completed = subprocess.run(
+                self.command + [str(path) for path in paths],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=self.timeout,
+            )
+            if completed.returncode != 0:
+                # most formatters stop at the first invalid file, which is isolated by
+                # formatting each half of the batch separately
+                if len(files) > 1:
+                    middle = len(files) // 2
+                    return self._format_batch(files[:middle]) + self._format_batch(
+                        files[middle:]
+                    )
+                error = completed.stderr.strip() or f"exit code {completed.returncode}"
+                return [(files[0][1], error)]
+            return [(path.read_text(encoding="utf-8"), None) for path in paths]
+
+
+def default_formatters() -> Dict[str, ExternalFormatter]:
+    """
+    Create the formatters registered by default, by file extension.
+
+    Returns
+    -------
+    Dict[str, ExternalFormatter]
+        The formatters, shared between the extensions of a same formatter.
+    """
+    formatters = [
+        WorkerFormatter(
+            "prettier",
+            [".js", ".mjs", ".ts", ".tsx", ".html", ".htm", ".css"],
+            ["node", "-e", PRETTIER_WORKER_SCRIPT],
+        ),
+        BatchFormatter(
+            "google-java-format",
+            [".java"],
+            ["google-java-format", "--replace"],
+            version_command=["google-java-format", "--version"],
+        ),
+        # gofmt has no version flag, it ships with the Go toolchain
+        BatchFormatter(
+            "gofmt", [".go"], ["gofmt", "-w"], version_command=["go", "version"]
+        ),
+    ]
+    return {
+        extension: formatter
+        for formatter in formatters
+        for extension in formatter.extensions
+    }
+
+
+def close_formatters(formatters: Dict[str, ExternalFormatter]) -> None:
+    for formatter in set(formatters.values()):
+        formatter.close()
+
+
+FORMATTERS = default_formatters()
+atexit.register(close_formatters, FORMATTERS)
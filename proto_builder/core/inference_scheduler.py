@@ -0,0 +1,184 @@
+"""
+Inference Scheduler Module
+
+This module provides an InferenceScheduler that multiplexes many in-flight chat completions
+on a single asyncio event loop. Each completion goes through the coroutine API of the AI class
+(`AI.anext` / `AI.astart`), so no thread is held while a request waits on the network, and the
+number of concurrent requests is capped globally as well as per model.
+
+Classes:
+    InferenceScheduler: Runs AI completions concurrently with per-model concurrency limits.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from typing import Any, Awaitable, Dict, Iterable, List, Optional
+
+from proto_builder.core.ai import AI, Message
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceScheduler:
+    """
+    Runs AI completions concurrently on one event loop with per-model concurrency limits.
+
+    Every request first acquires the semaphore of its model and then the global semaphore,
+    so a burst of requests for one model cannot starve requests for another one. Token
+    accounting is unchanged: each AI instance records its own usage in its `TokenUsageLog`.
+
+    The scheduler only relies on `AI.anext`, so it can be exercised without network access
+    by assigning a local fake chat model (for instance langchain's `FakeListChatModel`)
+    to `ai.llm`.
+
+    Attributes
+    ----------
+    max_concurrency : int
+        The maximum number of completions in flight across all models.
+    default_model_limit : int
+        The maximum number of completions in flight for a model without an explicit limit.
+    model_limits : Dict[str, int]
+        Explicit per-model limits keyed by model name.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 256,
+        default_model_limit: int = 32,
+        model_limits: Optional[Dict[str, int]] = None,
+    ):
+        if max_concurrency < 1 or default_model_limit < 1:
+            raise ValueError("Concurrency limits must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.default_model_limit = default_model_limit
+        self.model_limits = dict(model_limits or {})
+        self._global_semaphore: Optional[asyncio.Semaphore] = None
+        self._model_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """The number of completions currently awaiting a response."""
+        return self._in_flight
+
+    def _semaphores(self, model_name: str):
+        # Semaphores are created lazily so that they bind to the loop actually running them.
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(self.max_concurrency)
+        if model_name not in self._model_semaphores:
+            limit = self.model_limits.get(model_name, self.default_model_limit)
+            self._model_semaphores[model_name] = asyncio.Semaphore(limit)
+        return self._model_semaphores[model_name], self._global_semaphore
+
+    async def next(
+        self,
+        ai: AI,
+        messages: List[Message],
+        prompt: Optional[str] = None,
+        *,
+        step_name: str,
+    ) -> List[Message]:
+        """
+        Advance a conversation through `AI.anext` once a concurrency slot is available.
+
+        Parameters
+        ----------
+        ai : AI
+            The AI instance to run the completion with.
+        messages : List[Message]
+            The list of messages in the conversation.
+        prompt : Optional[str], optional
+            The prompt to use, by default None.
+        step_name : str
+            The name of the step.
+
+        Returns
+        -------
+        List[Message]
+            The updated list of messages in the conversation.
+        """
+        model_semaphore, global_semaphore = self._semaphores(ai.model_name)
+        async with model_semaphore, global_semaphore:
+            self._in_flight += 1
+            try:
+                return await ai.anext(messages, prompt, step_name=step_name)
+            finally:
+                self._in_flight -= 1
+
+    async def start(
+        self, ai: AI, system: str, user: Any, *, step_name: str
+    ) -> List[Message]:
+        """
+        Start a conversation through `AI.astart` once a concurrency slot is available.
+
+        Parameters
+        ----------
+        ai : AI
+            The AI instance to run the completion with.
+        system : str
+            The content of the system message.
+        user : str
+            The content of the user message.
+        step_name : str
+            The name of the step.
+
+        Returns
+        -------
+        List[Message]
+            The list of messages in the conversation.
+        """
+        model_semaphore, global_semaphore = self._semaphores(ai.model_name)
+        async with model_semaphore, global_semaphore:
+            self._in_flight += 1
+            try:
+                return await ai.astart(system, user, step_name=step_name)
+            finally:
+                self._in_flight -= 1
+
+    async def gather(
+        self, requests: Iterable[Awaitable[List[Message]]], return_exceptions=False
+    ) -> List[Any]:
+        """
+        Await a batch of scheduled requests, returning their results in submission order.
+
+        Parameters
+        ----------
+        requests : Iterable[Awaitable[List[Message]]]
+            Coroutines created with `InferenceScheduler.next` or `InferenceScheduler.start`.
+        return_exceptions : bool, optional
+            If True, failed requests yield their exception instead of cancelling the batch.
+
+        Returns
+        -------
+        List[Any]
+            The conversation (or exception) of every request.
+        """
+        return await asyncio.gather(*requests, return_exceptions=return_exceptions)
+
+    def run(
+        self, requests: Iterable[Awaitable[List[Message]]], return_exceptions=False
+    ) -> List[Any]:
+        """
+        Run a batch of scheduled requests to completion from synchronous code.
+
+        Parameters
+        ----------
+        requests : Iterable[Awaitable[List[Message]]]
+            Coroutines created with `InferenceScheduler.next` or `InferenceScheduler.start`.
+        return_exceptions : bool, optional
+            If True, failed requests yield their exception instead of cancelling the batch.
+
+        Returns
+        -------
+        List[Any]
+            The conversation (or exception) of every request.
+        """
+        requests = list(requests)
+        logger.debug(f"Scheduling {len(requests)} chat completions")
+        # A fresh loop gets fresh semaphores
+        self._global_semaphore = None
+        self._model_semaphores = {}
+        return asyncio.run(self.gather(requests, return_exceptions=return_exceptions))
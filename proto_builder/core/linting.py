@@ -1,43 +1,203 @@
+import hashlib
+import logging
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple
+
 import black
 
-from proto_builder.core.files_dict import FilesDict
+from proto_builder.core.default.paths import lint_cache_path
+from proto_builder.core.files_dict import FilesDict, content_digest
+from proto_builder.core.formatters import ExternalFormatter
+from proto_builder.core.response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# Number of files formatted by one task of the process pool
+LINT_CHUNK_SIZE = 16
+# Below this number of files to format, starting worker processes costs more than it saves
+MIN_PARALLEL_FILES = 8
+# Maximum number of contents remembered as formatted by the process
+MAX_CLEAN_CONTENTS = 64 * 1024
+# Maximum total size of the compressed linted contents in the persistent lint cache
+LINT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+
+def format_python(content: str, config: dict) -> Tuple[str, Optional[str]]:
+    """
+    Format Python code with `black`, never raising.
+
+    Parameters
+    ----------
+    content : str
+        The Python source code.
+    config : dict
+        Keyword arguments for `black.FileMode`.
+
+    Returns
+    -------
+    Tuple[str, Optional[str]]
+        The formatted code, or the original code if it could not be formatted, and the
+        error message in the latter case.
+    """
+    try:
+        return black.format_str(content, mode=black.FileMode(**config)), None
+    except black.NothingChanged:
+        return content, None
+    except Exception as error:
+        return content, str(error)
+
+
+def _format_python_chunk(
+    contents: List[str], config: dict
+) -> List[Tuple[str, Optional[str]]]:
+    # runs in a worker process
+    return [format_python(content, config) for content in contents]
+
+
+@lru_cache(maxsize=None)
+def default_lint_cache() -> Optional[ResponseCache]:
+    """
+    Open the persistent lint cache of the user, shared by all projects.
+
+    The linted contents are kept in their own directory of the user cache, apart from the
+    model responses, and bounded by `LINT_CACHE_MAX_BYTES`.
+
+    Returns
+    -------
+    ResponseCache, optional
+        The cache, or None if its directory cannot be created.
+    """
+    try:
+        return ResponseCache(lint_cache_path(), max_bytes=LINT_CACHE_MAX_BYTES)
+    except OSError as error:
+        logger.warning(f"Lint cache unavailable, linting without it: {error}")
+        return None
 
 
 class Linting:
-    def __init__(self):
+    # (extension, config, content digest) of contents already known to be formatted, shared
+    # by all instances since the linters are deterministic, least recently used first
+    _clean_contents: "OrderedDict[tuple, None]" = OrderedDict()
+    _clean_contents_lock = threading.Lock()
+
+    def __init__(
+        self,
+        cache: Optional[ResponseCache] = None,
+        max_workers: Optional[int] = None,
+        formatters: Optional[Dict[str, ExternalFormatter]] = None,
+    ):
         # Dictionary to hold linting methods for different file types
         self.linters = {".py": self.lint_python}
-
-    import black
+        # External formatters for the other file types, fed whole batches of files. They are
+        # opt-in, e.g. `FORMATTERS`, shared by all instances to keep their workers alive.
+        self.formatters = dict(formatters or {})
+        # Persistent store of linted contents, shared across runs, such as
+        # `default_lint_cache()`
+        self.cache = cache
+        self.max_workers = max_workers
+        self.files_skipped = 0
+        self.files_unchanged = 0
+        self.cache_hits = 0
 
     def lint_python(self, content, config):
         """Lint Python files using the `black` library, handling all exceptions silently and logging them.
         This function attempts to format the code and returns the formatted code if successful.
         If any error occurs during formatting, it logs the error and returns the original content.
         """
-        try:
-            # Try to format the content using black
-            linted_content = black.format_str(content, mode=black.FileMode(**config))
-        except black.NothingChanged:
-            # If nothing changed, log the info and return the original content
-            print("\nInfo: No changes were made during formatting.\n")
-            linted_content = content
-        except Exception as error:
-            # If any other exception occurs, log the error and return the original content
+        linted_content, error = format_python(content, config)
+        if error is not None:
+            # If any exception occurs, log the error and return the original content
             print(f"\nError: Could not format due to {error}\n")
-            linted_content = content
         return linted_content
 
-    def lint_files(self, files_dict: FilesDict, config: dict = None) -> FilesDict:
+    def register_formatter(self, formatter: ExternalFormatter) -> None:
+        """Format the files with the extensions of `formatter` with it."""
+        for extension in formatter.extensions:
+            self.linters.pop(extension, None)
+            self.formatters[extension] = formatter
+
+    @classmethod
+    def _is_clean(cls, key: tuple) -> bool:
+        with cls._clean_contents_lock:
+            if key not in cls._clean_contents:
+                return False
+            cls._clean_contents.move_to_end(key)
+            return True
+
+    @classmethod
+    def _mark_clean(cls, key: tuple) -> None:
+        with cls._clean_contents_lock:
+            cls._clean_contents[key] = None
+            cls._clean_contents.move_to_end(key)
+            while len(cls._clean_contents) > MAX_CLEAN_CONTENTS:
+                cls._clean_contents.popitem(last=False)
+
+    def _store(self, cache_key: str, content: str) -> None:
+        # the lint cache is shared by every running project, storing is best effort
+        try:
+            self.cache.put(cache_key, content)
+        except (OSError, ValueError) as error:
+            # e.g. lone surrogates, which cannot be encoded to be stored
+            logger.warning(f"Could not store linted content in the cache: {error}")
+
+    def _cache_key(self, extension: str, config_key: str, digest: str) -> Optional[str]:
+        if extension in self.linters:
+            version = black.__version__
+        else:
+            version = self.formatters[extension].cache_key
+            if version is None:
+                # unknown formatter version, the result must not outlive an upgrade
+                return None
+        payload = "\0".join([version, extension, config_key, digest])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _format_python_parallel(
+        self, contents: List[str], config: dict
+    ) -> List[Tuple[str, Optional[str]]]:
+        chunks = [
+            contents[start : start + LINT_CHUNK_SIZE]
+            for start in range(0, len(contents), LINT_CHUNK_SIZE)
+        ]
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                results = executor.map(_format_python_chunk, chunks, repeat(config))
+                return [result for chunk in results for result in chunk]
+        except (OSError, RuntimeError) as error:
+            # e.g. sandboxes without process support, or a broken worker
+            logger.warning(f"Linting in parallel failed, linting serially: {error}")
+            return [format_python(content, config) for content in contents]
+
+    def lint_files(
+        self, files_dict: FilesDict, config: dict = None, changed_only: bool = False
+    ) -> FilesDict:
         """
         Lints files based on their extension using registered linting functions.
 
+        Contents already linted with the same `black` version and configuration are taken
+        from the in-process record of clean contents or from the persistent `cache`. The
+        remaining Python files are formatted on a process pool, in chunks of
+        `LINT_CHUNK_SIZE` files, and the files of every other language with a registered
+        external formatter are handed to it in a single batch. Files whose formatter is
+        unavailable are left unchanged.
+
+        With `changed_only`, only the files changed since the baseline snapshot of
+        `files_dict` are linted, the others being taken as linted already; they are counted
+        in `files_unchanged`.
+
         Parameters
         ----------
         files_dict : FilesDict
             The dictionary of file names to their respective source code content.
         config : dict, optional
             A dictionary of configuration options for the linting tools.
+        changed_only : bool, optional
+            Whether to lint only the files changed since the baseline snapshot, when
+            `files_dict` has one. Default is False.
 
         Returns
         -------
@@ -46,19 +206,96 @@ class Linting:
         """
         if config is None:
             config = {}
+        config_key = repr(sorted(config.items()))
 
-        for filename, content in files_dict.items():
+        filenames = list(files_dict)
+        if (
+            changed_only
+            and isinstance(files_dict, FilesDict)
+            and files_dict.has_baseline()
+        ):
+            changed_files = files_dict.changed_files()
+            self.files_unchanged += len(filenames) - len(changed_files)
+            filenames = [name for name in filenames if name in changed_files]
+
+        # (filename, extension, cache key, content) of the files left to lint
+        jobs = []
+        for filename in filenames:
+            content = files_dict[filename]
             extension = filename[
                 filename.rfind(".") :
             ].lower()  # Ensure case insensitivity
-            if extension in self.linters:
-                original_content = content
-                linted_content = self.linters[extension](content, config)
-                if linted_content != original_content:
-                    print(f"Linted {filename}.")
+            if extension not in self.linters and extension not in self.formatters:
+                logger.debug(f"No linter registered for {filename}.")
+                continue
+            if isinstance(files_dict, FilesDict):
+                digest = files_dict.content_digest(filename)
+            else:
+                digest = content_digest(content)
+            if self._is_clean((extension, config_key, digest)):
+                self.files_skipped += 1
+                continue
+            cache_key = self._cache_key(extension, config_key, digest)
+            cached = None
+            if self.cache is not None and cache_key is not None:
+                cached = self.cache.get(cache_key)
+            if cached is not None:
+                self.cache_hits += 1
+                files_dict[filename] = cached
+                self._mark_clean((extension, config_key, content_digest(cached)))
+                continue
+            jobs.append((filename, extension, cache_key, content))
+
+        python_jobs = [job for job in jobs if job[1] == ".py"]
+        if (
+            len(python_jobs) >= MIN_PARALLEL_FILES
+            and self.linters.get(".py") == self.lint_python
+        ):
+            results = self._format_python_parallel(
+                [job[3] for job in python_jobs], config
+            )
+            for (filename, _, _, _), (_, error) in zip(python_jobs, results):
+                if error is not None:
+                    print(f"\nError: Could not format {filename} due to {error}\n")
+            linted = {job[0]: result[0] for job, result in zip(python_jobs, results)}
+        else:
+            linted = {}
+
+        batches = {}
+        for job in jobs:
+            if job[1] not in self.linters:
+                batches.setdefault(self.formatters[job[1]], []).append(job)
+        for formatter, batch in batches.items():
+            results = formatter.format_batch([(job[0], job[3]) for job in batch])
+            for (filename, _, _, _), (linted_content, error) in zip(batch, results):
+                if error is None:
+                    linted[filename] = linted_content
+                elif formatter.disabled:
+                    logger.debug(f"{formatter.name} disabled for {filename}.")
                 else:
-                    print(f"No changes made for {filename}.")
-                files_dict[filename] = linted_content
+                    print(f"\nError: Could not format {filename} due to {error}\n")
+
+        linted_count = changed = 0
+        for filename, extension, cache_key, content in jobs:
+            if filename in linted:
+                linted_content = linted[filename]
+            elif extension in self.linters:
+                linted_content = self.linters[extension](content, config)
             else:
-                print(f"No linter registered for {filename}.")
+                # not formatted, retried on the next run
+                continue
+            linted_count += 1
+            if linted_content != content:
+                logger.debug(f"Linted {filename}.")
+                changed += 1
+            files_dict[filename] = linted_content
+            self._mark_clean((extension, config_key, content_digest(linted_content)))
+            if self.cache is not None and cache_key is not None:
+                self._store(cache_key, linted_content)
+
+        print(
+            f"Linted {linted_count} files ({changed} changed), "
+            f"{self.cache_hits} from cache, {self.files_skipped} unchanged skipped, "
+            f"{self.files_unchanged} not changed since the snapshot."
+        )
         return files_dict
@@ -0,0 +1,184 @@
+"""
+Piece Table Module
+
+This module provides an immutable, line-based piece table for storing file contents. A file is kept as a
+sequence of pieces, each piece being a tuple of at most `PieceTable.PIECE_LINES` lines. Applying an edit
+creates a new version that rebuilds only the pieces containing edited lines and shares every other piece
+with the previous version, so the cost of an edit is proportional to its size rather than to the size of
+the file.
+
+Classes:
+    PieceTable: An immutable, line-based piece table with structural sharing between versions.
+
+Functions:
+    splice_lines(lines, removed, inserted) -> List[str]
+        Remove and insert lines in a list of lines in a single pass.
+"""
+
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+
+def splice_lines(
+    lines: List[str], removed: Set[int], inserted: Dict[int, List[str]]
+) -> List[str]:
+    """
+    Remove and insert lines in a list of lines in a single pass.
+
+    Parameters
+    ----------
+    lines : List[str]
+        The original lines, numbered from 1.
+    removed : Set[int]
+        The numbers of the lines to remove. Numbers outside the lines are ignored.
+    inserted : Dict[int, List[str]]
+        The lines to insert after each line number. Numbers below 1 insert at the start,
+        numbers past the last line insert at the end, in ascending order.
+
+    Returns
+    -------
+    List[str]
+        The edited lines, built from slices of the original lines and the inserted lines.
+    """
+    segments = []
+    position = 0  # lines[:position] have been handled
+    for line_number in sorted(removed.union(inserted)):
+        if 0 < line_number <= len(lines):
+            segments.extend(lines[position : line_number - 1])
+            if line_number not in removed:
+                segments.append(lines[line_number - 1])
+            position = line_number
+        elif line_number > len(lines):
+            segments.extend(lines[position:])
+            position = len(lines)
+        segments.extend(inserted.get(line_number, ()))
+    segments.extend(lines[position:])
+    return segments
+
+
+class PieceTable:
+    """
+    An immutable, line-based piece table with structural sharing between versions.
+
+    Attributes
+    ----------
+    line_count : int
+        The number of lines in the file.
+    """
+
+    PIECE_LINES = 512
+
+    def __init__(self, pieces: Sequence[Tuple[str, ...]] = ()):
+        pieces = tuple(piece for piece in pieces if piece)
+        if not pieces:
+            # an empty file still consists of one empty line, like "".split("\n")
+            pieces = (("",),)
+        self._pieces = pieces
+        self._starts = []
+        line_count = 0
+        for piece in pieces:
+            self._starts.append(line_count + 1)
+            line_count += len(piece)
+        self.line_count = line_count
+        self._text: Optional[str] = None
+
+    @classmethod
+    def from_text(cls, text: str) -> "PieceTable":
+        """
+        Create a piece table holding the given text.
+
+        Parameters
+        ----------
+        text : str
+            The content of the file.
+
+        Returns
+        -------
+        PieceTable
+            A piece table holding the text.
+        """
+        table = cls(_to_pieces(text.split("\n")))
+        table._text = text
+        return table
+
+    @property
+    def text(self) -> str:
+        """The content of the file, materialized once per version."""
+        if self._text is None:
+            self._text = "\n".join(self.lines())
+        return self._text
+
+    def lines(self) -> Iterator[str]:
+        """Iterate over the lines of the file."""
+        for piece in self._pieces:
+            yield from piece
+
+    def apply_edits(
+        self, removed: Set[int], inserted: Dict[int, List[str]]
+    ) -> "PieceTable":
+        """
+        Create a new version with lines removed and inserted, as in `splice_lines`.
+
+        Only the pieces containing edited lines are rebuilt; all other pieces are shared.
+
+        Parameters
+        ----------
+        removed : Set[int]
+            The numbers of the lines to remove.
+        inserted : Dict[int, List[str]]
+            The lines to insert after each line number.
+
+        Returns
+        -------
+        PieceTable
+            The edited version.
+        """
+        if not removed and not inserted:
+            return self
+
+        prefix: List[str] = []
+        suffix: List[str] = []
+        # local edits of every touched piece, with line numbers relative to the piece
+        touched: Dict[int, Tuple[Set[int], Dict[int, List[str]]]] = {}
+        for line_number in sorted(inserted):
+            if line_number < 1:
+                prefix.extend(inserted[line_number])
+            elif line_number > self.line_count:
+                suffix.extend(inserted[line_number])
+            else:
+                index, local_line = self._locate(line_number)
+                touched.setdefault(index, (set(), {}))[1][local_line] = inserted[
+                    line_number
+                ]
+        for line_number in removed:
+            if 1 <= line_number <= self.line_count:
+                index, local_line = self._locate(line_number)
+                touched.setdefault(index, (set(), {}))[0].add(local_line)
+
+        pieces = list(_to_pieces(prefix))
+        for index, piece in enumerate(self._pieces):
+            if index in touched:
+                pieces.extend(_to_pieces(splice_lines(list(piece), *touched[index])))
+            else:
+                pieces.append(piece)
+        pieces.extend(_to_pieces(suffix))
+        return PieceTable(pieces)
+
+    def _locate(self, line_number: int) -> Tuple[int, int]:
+        index = bisect_right(self._starts, line_number) - 1
+        return index, line_number - self._starts[index] + 1
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PieceTable):
+            return self.text == other.text
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"PieceTable(lines={self.line_count}, pieces={len(self._pieces)})"
+
+
+def _to_pieces(lines: List[str]) -> List[Tuple[str, ...]]:
+    return [
+        tuple(lines[start : start + PieceTable.PIECE_LINES])
+        for start in range(0, len(lines), PieceTable.PIECE_LINES)
+    ]
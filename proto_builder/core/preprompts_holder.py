@@ -1,14 +1,58 @@
+import os
+import threading
+import time
+
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, Tuple
 
 from proto_builder.core.default.disk_memory import DiskMemory
 
+# Minimum number of seconds between two checks of the preprompt files for modifications
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+class _CacheEntry:
+    def __init__(self, signature: Tuple, preprompts: Dict[str, str]):
+        self.signature = signature
+        self.preprompts = preprompts
+        self.checked_at = time.monotonic()
+        # system prompts composed from these preprompts, keyed by the composing function
+        self.composed: Dict[Callable, str] = {}
+
+
+# Process-wide cache shared by every holder, keyed by the resolved preprompts path
+_cache: Dict[Path, _CacheEntry] = {}
+_cache_lock = threading.Lock()
+
+
+def _signature(path: Path) -> Tuple:
+    """The names, modification times and sizes of all files below a directory."""
+    signature = []
+    for root, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                stat = os.stat(os.path.join(root, file_name))
+            except FileNotFoundError:
+                continue
+            signature.append(
+                (
+                    os.path.relpath(os.path.join(root, file_name), path),
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                )
+            )
+    return tuple(sorted(signature))
+
 
 class PrepromptsHolder:
     """
     A holder for preprompt texts that are stored on disk.
 
     This class provides methods to retrieve preprompt texts from a specified directory.
+    The texts are cached for the whole process and only re-read when a file in the
+    directory is added, removed or modified, which is checked at most once every
+    `RELOAD_CHECK_INTERVAL` seconds. Edited custom preprompts are therefore picked up
+    on the next step without re-reading every file on every step.
 
     Attributes
     ----------
@@ -19,11 +63,58 @@ class PrepromptsHolder:
     -------
     get_preprompts() -> Dict[str, str]
         Retrieve all preprompt texts from the directory and return them as a dictionary.
+    compose(builder) -> str
+        Build a system prompt from the preprompts, memoized until the preprompts change.
     """
 
     def __init__(self, preprompts_path: Path):
         self.preprompts_path = preprompts_path
 
+    def _entry(self) -> _CacheEntry:
+        path = Path(self.preprompts_path).absolute()
+        with _cache_lock:
+            entry = _cache.get(path)
+            now = time.monotonic()
+            if entry is not None and now - entry.checked_at < RELOAD_CHECK_INTERVAL:
+                return entry
+            signature = _signature(path)
+            if entry is not None and entry.signature == signature:
+                entry.checked_at = now
+                return entry
+            preprompts_repo = DiskMemory(path)
+            entry = _CacheEntry(
+                signature,
+                {file_name: preprompts_repo[file_name] for file_name in preprompts_repo},
+            )
+            _cache[path] = entry
+            return entry
+
     def get_preprompts(self) -> Dict[str, str]:
-        preprompts_repo = DiskMemory(self.preprompts_path)
-        return {file_name: preprompts_repo[file_name] for file_name in preprompts_repo}
+        return dict(self._entry().preprompts)
+
+    def compose(self, builder: Callable[[Dict[str, str]], str]) -> str:
+        """
+        Build a system prompt from the preprompts, memoized until the preprompts change.
+
+        Parameters
+        ----------
+        builder : Callable[[Dict[str, str]], str]
+            A function composing the system prompt from the preprompts, such as
+            `setup_sys_prompt`.
+
+        Returns
+        -------
+        str
+            The composed system prompt.
+        """
+        entry = self._entry()
+        composed = entry.composed.get(builder)
+        if composed is None:
+            composed = entry.composed[builder] = builder(entry.preprompts)
+        return composed
+
+    @staticmethod
+    def clear_cache() -> None:
+        """Drop the cached preprompts of every directory."""
+        with _cache_lock:
+            _cache.clear()
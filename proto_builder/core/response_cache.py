@@ -0,0 +1,221 @@
+"""
+Response Cache Module
+
+This module provides a content-addressed, on-disk cache for language model responses. Entries are
+keyed by a hash of the model name, the temperature and the serialized messages sent to the model,
+so re-running a step with the same system prompt, preprompts and files returns the stored response
+instead of paying for a new completion.
+
+Entries are stored as zlib-compressed files in a single directory. The total size of the store is
+bounded, and the least recently used entries are evicted once the bound is exceeded. Recency is
+persisted through the file modification times, so it survives restarts.
+
+Classes:
+    ResponseCache: A size-bounded, LRU-evicted on-disk store for serialized model responses.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import zlib
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_SUFFIX = ".z"
+
+
+class ResponseCache:
+    """
+    A size-bounded, LRU-evicted on-disk store for serialized model responses.
+
+    Attributes
+    ----------
+    path : Path
+        The directory where cache entries are stored.
+    max_bytes : int
+        The maximum total size of the compressed entries on disk.
+    hits : int
+        The number of lookups answered from the cache.
+    misses : int
+        The number of lookups that were not found in the cache.
+    evictions : int
+        The number of entries evicted to respect `max_bytes`.
+    """
+
+    def __init__(self, path: Union[str, Path], max_bytes: int = 256 * 1024 * 1024):
+        self.path = Path(path).absolute()
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._load_index()
+
+    @staticmethod
+    def make_key(model_name: str, temperature: Optional[float], messages: str) -> str:
+        """
+        Compute the content address of a request.
+
+        Parameters
+        ----------
+        model_name : str
+            The name of the model the request is sent to.
+        temperature : float, optional
+            The sampling temperature of the model.
+        messages : str
+            The serialized messages sent to the model.
+
+        Returns
+        -------
+        str
+            A hex digest identifying the request.
+        """
+        payload = json.dumps([model_name, temperature, messages])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / f"{key}{CACHE_FILE_SUFFIX}"
+
+    def _load_index(self) -> None:
+        entries = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(CACHE_FILE_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # evicted by another process meanwhile
+                    key = entry.name[: -len(CACHE_FILE_SUFFIX)]
+                    entries.append((stat.st_mtime, key, stat.st_size))
+        # oldest first, so that the front of the index is the next eviction candidate
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Retrieve a cached response and mark it as most recently used.
+
+        Parameters
+        ----------
+        key : str
+            The key computed with `make_key`.
+
+        Returns
+        -------
+        str, optional
+            The cached response, or None if the key is not cached.
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            entry_path = self._entry_path(key)
+            try:
+                value = zlib.decompress(entry_path.read_bytes()).decode("utf-8")
+            except (OSError, zlib.error) as error:
+                logger.warning(f"Dropping unreadable cache entry {key}: {error}")
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            try:
+                os.utime(entry_path)
+            except OSError:
+                pass
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        """
+        Store a response, evicting least recently used entries if the store grows too large.
+
+        Errors writing the entry are logged and ignored, so that storing a response never
+        fails the request it answers.
+
+        Parameters
+        ----------
+        key : str
+            The key computed with `make_key`.
+        value : str
+            The serialized response to store.
+        """
+        data = zlib.compress(value.encode("utf-8"))
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            entry_path = self._entry_path(key)
+            # a unique temporary file, as the directory is shared by concurrent processes
+            # that may store the same key
+            try:
+                fd, tmp_name = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_name, entry_path)
+                finally:
+                    try:
+                        os.unlink(tmp_name)
+                    except FileNotFoundError:
+                        pass
+            except OSError as error:
+                # storing is best effort, the response was obtained already
+                logger.warning(f"Could not store cache entry {key}: {error}")
+                return
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._total_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        self._total_bytes -= self._entries.pop(key, 0)
+        try:
+            self._entry_path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        """Remove every entry from the cache."""
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    @property
+    def size_bytes(self) -> int:
+        """The total size of the compressed entries on disk."""
+        return self._total_bytes
+
+    def stats(self) -> dict:
+        """
+        Return the hit/miss counters and the current size of the cache.
+
+        Returns
+        -------
+        dict
+            A dictionary with the counters, the number of entries and the size in bytes.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "size_bytes": self._total_bytes,
+        }
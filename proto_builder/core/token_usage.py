@@ -1,10 +1,16 @@
 import base64
+import hashlib
 import io
+import json
 import logging
 import math
+import struct
+import threading
+import time
 
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import tiktoken
 
@@ -27,6 +33,12 @@ Message = Union[AIMessage, HumanMessage, SystemMessage]
 
 logger = logging.getLogger(__name__)
 
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers, which carry the image dimensions
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Number of decoded bytes first inspected when looking for image dimensions
+IMAGE_HEADER_PREFIX_BYTES = 1024
+
 
 @dataclass
 class TokenUsage:
@@ -49,6 +61,12 @@ class TokenUsage:
         The cumulative number of completion tokens used up to this step.
     total_tokens : int
         The cumulative total number of tokens used up to this step.
+    cache_hit : bool
+        Whether the response of the step was served from the response cache.
+    in_step_cached_prompt_tokens : int
+        The number of prompt tokens of the step read from the provider's prompt cache.
+    total_cached_prompt_tokens : int
+        The cumulative number of prompt tokens read from the provider's prompt cache.
     """
 
     """
@@ -62,20 +80,153 @@ class TokenUsage:
     total_prompt_tokens: int
     total_completion_tokens: int
     total_tokens: int
+    cache_hit: bool = False
+    in_step_cached_prompt_tokens: int = 0
+    total_cached_prompt_tokens: int = 0
+
+
+class EncodingRegistry:
+    """
+    Process-wide, thread-safe registry of tiktoken encodings.
+
+    Loading an encoding reads and parses its BPE ranks, so every encoding is loaded once per
+    process and shared by all tokenizers. Loads can be started in a background thread at
+    startup, and the time each load took is kept as a startup metric.
+    """
+
+    DEFAULT_ENCODING = "cl100k_base"
+
+    def __init__(self):
+        self._encodings: Dict[str, tiktoken.Encoding] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._encoding_locks: Dict[str, threading.Lock] = {}
+
+    def encoding_name_for_model(self, model_name: str) -> str:
+        """
+        Get the name of the encoding used to count tokens for a model.
+
+        Parameters
+        ----------
+        model_name : str
+            The name of the model.
+
+        Returns
+        -------
+        str
+            The name of the tiktoken encoding.
+        """
+        if "gpt-4" in model_name or "gpt-3.5" in model_name:
+            try:
+                return tiktoken.encoding_name_for_model(model_name)
+            except KeyError:
+                pass
+        return self.DEFAULT_ENCODING
+
+    def get(self, model_name: str) -> tiktoken.Encoding:
+        """
+        Get the encoding for a model, loading it on first use.
+
+        Parameters
+        ----------
+        model_name : str
+            The name of the model.
+
+        Returns
+        -------
+        tiktoken.Encoding
+            The shared encoding.
+        """
+        encoding_name = self.encoding_name_for_model(model_name)
+        encoding = self._encodings.get(encoding_name)
+        if encoding is not None:
+            return encoding
+
+        with self._lock:
+            encoding_lock = self._encoding_locks.setdefault(
+                encoding_name, threading.Lock()
+            )
+        # Loads of different encodings do not wait on each other
+        with encoding_lock:
+            if encoding_name not in self._encodings:
+                start = time.perf_counter()
+                encoding = tiktoken.get_encoding(encoding_name)
+                self._load_seconds[encoding_name] = time.perf_counter() - start
+                self._encodings[encoding_name] = encoding
+                logger.debug(
+                    f"Loaded encoding {encoding_name} in {self._load_seconds[encoding_name]:.3f}s"
+                )
+        return self._encodings[encoding_name]
+
+    def warm(
+        self, model_names: Iterable[str], background: bool = True
+    ) -> Optional[threading.Thread]:
+        """
+        Load the encodings of the given models ahead of their first use.
+
+        Parameters
+        ----------
+        model_names : Iterable[str]
+            The names of the models whose encodings should be loaded.
+        background : bool, optional
+            If True, load in a daemon thread and return it, by default True.
+
+        Returns
+        -------
+        threading.Thread, optional
+            The warming thread, or None if the encodings were loaded synchronously.
+        """
+        model_names = list(model_names)
+
+        def _warm():
+            for model_name in model_names:
+                try:
+                    self.get(model_name)
+                except Exception as e:
+                    logger.warning(f"Could not warm encoding for {model_name}: {e}")
+
+        if not background:
+            _warm()
+            return None
+        thread = threading.Thread(target=_warm, name="encoding-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def load_times(self) -> Dict[str, float]:
+        """
+        Get the time in seconds it took to load each encoding.
+
+        Returns
+        -------
+        Dict[str, float]
+            The load time of every loaded encoding, keyed by encoding name.
+        """
+        return dict(self._load_seconds)
+
+
+ENCODING_REGISTRY = EncodingRegistry()
 
 
 class Tokenizer:
     """
     Tokenizer for counting tokens in text.
+
+    Token counts of message contents are memoized by content hash, so counting a growing
+    conversation only encodes the messages that were not seen before.
     """
 
+    MAX_MEMOIZED_MESSAGES = 4096
+    MAX_MEMOIZED_IMAGES = 1024
+
     def __init__(self, model_name):
         self.model_name = model_name
-        self._tiktoken_tokenizer = (
-            tiktoken.encoding_for_model(model_name)
-            if "gpt-4" in model_name or "gpt-3.5" in model_name
-            else tiktoken.get_encoding("cl100k_base")
-        )
+        self._message_tokens: "OrderedDict[bytes, int]" = OrderedDict()
+        self._image_sizes: "OrderedDict[bytes, Tuple[int, int]]" = OrderedDict()
+
+    @property
+    def _tiktoken_tokenizer(self) -> tiktoken.Encoding:
+        # Resolved on first use from the shared registry, so creating an AI costs nothing
+        return ENCODING_REGISTRY.get(self.model_name)
 
     def num_tokens(self, txt: str) -> int:
         """
@@ -93,6 +244,26 @@ class Tokenizer:
         """
         return len(self._tiktoken_tokenizer.encode(txt))
 
+    def num_tokens_batch(self, texts: List[str]) -> List[int]:
+        """
+        Get the number of tokens of several texts, encoding them in one batch.
+
+        Parameters
+        ----------
+        texts : List[str]
+            The texts to count the tokens in.
+
+        Returns
+        -------
+        List[int]
+            The number of tokens of each text, in the same order.
+        """
+        if not texts:
+            return []
+        if len(texts) == 1:
+            return [self.num_tokens(texts[0])]
+        return [len(tokens) for tokens in self._tiktoken_tokenizer.encode_batch(texts)]
+
     def num_tokens_for_base64_image(
         self, image_base64: str, detail: str = "high"
     ) -> int:
@@ -110,17 +281,13 @@ class Tokenizer:
         if detail == "low":
             return 85  # Fixed cost for low detail images
 
-        # Decode image from base64
-        image_data = base64.b64decode(image_base64)
-
-        # Convert byte data to image for size extraction
-        image = Image.open(io.BytesIO(image_data))
+        image_size = self.image_size_for_base64_image(image_base64)
 
         # Calculate the initial scale to fit within 2048 square while maintaining aspect ratio
-        max_dimension = max(image.size)
+        max_dimension = max(image_size)
         scale_factor = min(2048 / max_dimension, 1)  # Ensure we don't scale up
-        new_width = int(image.size[0] * scale_factor)
-        new_height = int(image.size[1] * scale_factor)
+        new_width = int(image_size[0] * scale_factor)
+        new_height = int(image_size[1] * scale_factor)
 
         # Scale such that the shortest side is 768px
         shortest_side = min(new_width, new_height)
@@ -139,6 +306,52 @@ class Tokenizer:
 
         return token_cost
 
+    def image_size_for_base64_image(self, image_base64: str) -> Tuple[int, int]:
+        """
+        Get the (width, height) of a base64 encoded image, optionally given as a data URL.
+
+        PNG and JPEG dimensions are read from the header bytes of a partial base64 decode;
+        other formats fall back to a full decode with PIL. Results are memoized by image hash.
+
+        Parameters
+        ----------
+        image_base64 : str
+            The base64 encoded string of the image.
+
+        Returns
+        -------
+        Tuple[int, int]
+            The width and height of the image in pixels.
+        """
+        if image_base64.startswith("data:"):
+            image_base64 = image_base64.partition(",")[2]
+
+        key = hashlib.blake2b(image_base64.encode("ascii"), digest_size=16).digest()
+        if key in self._image_sizes:
+            self._image_sizes.move_to_end(key)
+            return self._image_sizes[key]
+
+        image_size = None
+        n_bytes = IMAGE_HEADER_PREFIX_BYTES
+        while image_size is None:
+            # Only whole 4-character groups can be decoded on their own
+            n_chars = min(-(-n_bytes // 3) * 4, len(image_base64))
+            header = base64.b64decode(image_base64[:n_chars])
+            image_size, needs_more = _image_size_from_header(header)
+            if not needs_more or n_chars == len(image_base64):
+                break
+            n_bytes *= 4
+
+        if image_size is None:
+            # Convert byte data to image for size extraction
+            image = Image.open(io.BytesIO(base64.b64decode(image_base64)))
+            image_size = image.size
+
+        self._image_sizes[key] = image_size
+        if len(self._image_sizes) > self.MAX_MEMOIZED_IMAGES:
+            self._image_sizes.popitem(last=False)
+        return image_size
+
     def num_tokens_from_messages(self, messages: List[Message]) -> int:
         """
         Get the total number of tokens used by a list of messages, accounting for text and base64 encoded images.
@@ -154,28 +367,117 @@ class Tokenizer:
             The total number of tokens used by the messages.
         """
         n_tokens = 0
+        # contents not seen before, keyed by hash: [image tokens, texts, occurrences]
+        pending = {}
         for message in messages:
             n_tokens += 4  # Account for message framing tokens
 
-            if isinstance(message.content, str):
-                # Content is a simple string
-                n_tokens += self.num_tokens(message.content)
-            elif isinstance(message.content, list):
-                # Content is a list, potentially mixed with text and images
-                for item in message.content:
-                    if item.get("type") == "text":
-                        n_tokens += self.num_tokens(item["text"])
-                    elif item.get("type") == "image_url":
-                        image_detail = item["image_url"].get("detail", "high")
-                        image_base64 = item["image_url"].get("url")
-                        n_tokens += self.num_tokens_for_base64_image(
-                            image_base64, detail=image_detail
-                        )
+            key = self._content_key(message.content)
+            if key in self._message_tokens:
+                self._message_tokens.move_to_end(key)
+                n_tokens += self._message_tokens[key]
+            elif key in pending:
+                pending[key][2] += 1
+            else:
+                pending[key] = [*self._split_content(message.content), 1]
 
             n_tokens += 2  # Account for assistant's reply framing tokens
 
+        # Encode all new texts in a single batch
+        texts = [text for _, item_texts, _ in pending.values() for text in item_texts]
+        counts = iter(self.num_tokens_batch(texts))
+        for key, (image_tokens, item_texts, occurrences) in pending.items():
+            content_tokens = image_tokens + sum(next(counts) for _ in item_texts)
+            self._memoize(key, content_tokens)
+            n_tokens += content_tokens * occurrences
+
         return n_tokens
 
+    @staticmethod
+    def _content_key(content) -> bytes:
+        """
+        Hash a message content, so that memoized counts do not keep large contents alive.
+        """
+        if not isinstance(content, str):
+            content = json.dumps(content, sort_keys=True)
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+    def _split_content(self, content):
+        """
+        Split a message content into the token count of its images and its texts to encode.
+        """
+        if isinstance(content, str):
+            # Content is a simple string
+            return 0, [content]
+        image_tokens = 0
+        texts = []
+        if isinstance(content, list):
+            # Content is a list, potentially mixed with text and images
+            for item in content:
+                if item.get("type") == "text":
+                    texts.append(item["text"])
+                elif item.get("type") == "image_url":
+                    image_detail = item["image_url"].get("detail", "high")
+                    image_base64 = item["image_url"].get("url")
+                    image_tokens += self.num_tokens_for_base64_image(
+                        image_base64, detail=image_detail
+                    )
+        return image_tokens, texts
+
+    def _memoize(self, key: bytes, content_tokens: int) -> None:
+        self._message_tokens[key] = content_tokens
+        if len(self._message_tokens) > self.MAX_MEMOIZED_MESSAGES:
+            self._message_tokens.popitem(last=False)
+
+
+def _image_size_from_header(data: bytes) -> Tuple[Optional[Tuple[int, int]], bool]:
+    """
+    Read the dimensions of a PNG or JPEG image from the first bytes of its data.
+
+    Parameters
+    ----------
+    data : bytes
+        A prefix of the image data.
+
+    Returns
+    -------
+    Tuple[Optional[Tuple[int, int]], bool]
+        The (width, height) if found, and whether a longer prefix is needed to find it.
+    """
+    if data.startswith(PNG_SIGNATURE):
+        # The IHDR chunk always comes first: length, type, width, height
+        if len(data) < 24:
+            return None, True
+        if data[12:16] != b"IHDR":
+            return None, False
+        width, height = struct.unpack(">II", data[16:24])
+        return (width, height), False
+
+    if data.startswith(b"\xff\xd8"):
+        i = 2
+        while i + 4 <= len(data):
+            if data[i] != 0xFF:
+                return None, False
+            marker = data[i + 1]
+            if marker == 0xFF:
+                # fill byte
+                i += 1
+                continue
+            if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+                # standalone markers without a length
+                i += 2
+                continue
+            if marker in JPEG_SOF_MARKERS:
+                if i + 9 > len(data):
+                    return None, True
+                height, width = struct.unpack(">HH", data[i + 5 : i + 9])
+                return (width, height), False
+            (segment_len,) = struct.unpack(">H", data[i + 2 : i + 4])
+            i += 2 + segment_len
+        return None, True
+
+    return None, False
+
 
 class TokenUsageLog:
     """
@@ -187,13 +489,24 @@ class TokenUsageLog:
         self._cumulative_prompt_tokens = 0
         self._cumulative_completion_tokens = 0
         self._cumulative_total_tokens = 0
+        self._cumulative_cached_prompt_tokens = 0
         self._log = []
         self._tokenizer = Tokenizer(model_name)
 
-    def update_log(self, messages: List[Message], answer: str, step_name: str) -> None:
+    def update_log(
+        self,
+        messages: List[Message],
+        answer: str,
+        step_name: str,
+        cache_hit: bool = False,
+        cached_prompt_tokens: int = 0,
+    ) -> None:
         """
         Update the token usage log with the number of tokens used in the current step.
 
+        Responses served from the response cache are recorded as zero-token entries,
+        so that cumulative totals and costs only reflect what was sent to the provider.
+
         Parameters
         ----------
         messages : List[Message]
@@ -202,10 +515,21 @@ class TokenUsageLog:
             The answer from the AI.
         step_name : str
             The name of the step.
+        cache_hit : bool, optional
+            Whether the answer was served from the response cache, by default False.
+        cached_prompt_tokens : int, optional
+            The number of prompt tokens the provider reported as read from its prompt
+            cache, by default 0.
         """
-        prompt_tokens = self._tokenizer.num_tokens_from_messages(messages)
-        completion_tokens = self._tokenizer.num_tokens(answer)
+        if cache_hit:
+            prompt_tokens = completion_tokens = cached_prompt_tokens = 0
+        else:
+            prompt_tokens = self._tokenizer.num_tokens_from_messages(messages)
+            completion_tokens = self._tokenizer.num_tokens(answer)
+            # the prompt tokens are estimated locally, the cached ones reported by the provider
+            cached_prompt_tokens = min(cached_prompt_tokens, prompt_tokens)
         total_tokens = prompt_tokens + completion_tokens
+        self._cumulative_cached_prompt_tokens += cached_prompt_tokens
 
         self._cumulative_prompt_tokens += prompt_tokens
         self._cumulative_completion_tokens += completion_tokens
@@ -220,6 +544,9 @@ class TokenUsageLog:
                 total_prompt_tokens=self._cumulative_prompt_tokens,
                 total_completion_tokens=self._cumulative_completion_tokens,
                 total_tokens=self._cumulative_total_tokens,
+                cache_hit=cache_hit,
+                in_step_cached_prompt_tokens=cached_prompt_tokens,
+                total_cached_prompt_tokens=self._cumulative_cached_prompt_tokens,
             )
         )
 
@@ -243,9 +570,9 @@ class TokenUsageLog:
         str
             The token usage log formatted as a CSV string.
         """
-        result = "step_name,prompt_tokens_in_step,completion_tokens_in_step,total_tokens_in_step,total_prompt_tokens,total_completion_tokens,total_tokens\n"
+        result = "step_name,prompt_tokens_in_step,completion_tokens_in_step,total_tokens_in_step,total_prompt_tokens,total_completion_tokens,total_tokens,cached_prompt_tokens_in_step,total_cached_prompt_tokens\n"
         for log in self._log:
-            result += f"{log.step_name},{log.in_step_prompt_tokens},{log.in_step_completion_tokens},{log.in_step_total_tokens},{log.total_prompt_tokens},{log.total_completion_tokens},{log.total_tokens}\n"
+            result += f"{log.step_name},{log.in_step_prompt_tokens},{log.in_step_completion_tokens},{log.in_step_total_tokens},{log.total_prompt_tokens},{log.total_completion_tokens},{log.total_tokens},{log.in_step_cached_prompt_tokens},{log.total_cached_prompt_tokens}\n"
         return result
 
     def is_openai_model(self) -> bool:
@@ -270,6 +597,28 @@ class TokenUsageLog:
         """
         return self._cumulative_total_tokens
 
+    def cached_prompt_tokens(self) -> int:
+        """
+        Return the number of prompt tokens read from the provider's prompt cache.
+
+        Returns
+        -------
+        int
+            The cumulative number of cached prompt tokens.
+        """
+        return self._cumulative_cached_prompt_tokens
+
+    def uncached_prompt_tokens(self) -> int:
+        """
+        Return the number of prompt tokens the provider had to process in full.
+
+        Returns
+        -------
+        int
+            The cumulative number of prompt tokens not read from the prompt cache.
+        """
+        return self._cumulative_prompt_tokens - self._cumulative_cached_prompt_tokens
+
     def usage_cost(self) -> float | None:
         """
         Return the total cost in USD of the API usage.